@@ -46,6 +46,8 @@ try:
 except ImportError:
     import simplejson as json
 
+from services import metrics
+
 class DateTimeAwareJSONEncoder(json.JSONEncoder):
     """
     JSONEncoder subclass that knows how to encode date/time types
@@ -360,12 +362,14 @@ class Frame(object):
     """A class representing an APNs message frame for multiple sending"""
     def __init__(self):
         self.frame_data = bytearray()
+        self.item_count = 0
 
     def get_frame(self):
         return self.frame_data
 
     def add_item(self, token_hex, payload, identifier, expiry, priority):
         """Add a notification message to the frame"""
+        self.item_count += 1
         item_len = 0
         self.frame_data.extend('\2' + APNs.packed_uint_big_endian(item_len))
 
@@ -522,11 +526,18 @@ class GatewayConnection(APNsConnection):
                 self._sent_notifications.append(dict({'id': identifier, 'message': message}))
                 try:
                     self.write(message)
+                    count_sent('sent')
                 except socket_error as e:
+                    count_sent('failed')
                     _logger.info("sending notification with id:" + str(identifier) + " to APNS failed: " + str(type(e)) + ": " + str(e))
         
         else:
-            self.write(self._get_notification(token_hex, payload))
+            try:
+                self.write(self._get_notification(token_hex, payload))
+            except Exception:
+                count_sent('failed')
+                raise
+            count_sent('sent')
 
     def _wait_resending(self, timeout):
         """
@@ -541,7 +552,13 @@ class GatewayConnection(APNsConnection):
             elapsed += interval
 
     def send_notification_multiple(self, frame):
-        return self.write(frame.get_frame())
+        try:
+            ret = self.write(frame.get_frame())
+        except Exception:
+            count_sent('failed', frame.item_count)
+            raise
+        count_sent('sent', frame.item_count)
+        return ret
     
     def register_response_listener(self, response_listener):
         self._response_listener = response_listener
@@ -601,6 +618,11 @@ class GatewayConnection(APNsConnection):
             time.sleep(DELAY_RESEND_SECS) #DEBUG
         self._is_resending = False
 
+def count_sent(result, count=1):
+    if metrics.is_enabled():
+        metrics.inc('services_push_notifications_total', (('service', 'apns'), ('result', result)), count)
+
+
 class Util(object):
     @classmethod
     def getListIndexFromID(this_class, the_list, identifier):
@@ -0,0 +1,132 @@
+import json
+from multiprocessing.pool import ThreadPool
+from urlparse import urlparse
+
+from django.conf import settings
+from django.core.urlresolvers import resolve, Resolver404
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+
+from services.controller import BaseController
+from services.decorators import unauthenticated
+from services.utils import str_to_bool
+
+MAX_REQUESTS = getattr(settings, 'SERVICES_BATCH_MAX_REQUESTS', 50)
+MAX_WORKERS = getattr(settings, 'SERVICES_BATCH_MAX_WORKERS', 4)
+
+# the batch request's META copied to its sub requests
+SUB_REQUEST_META = frozenset(getattr(settings, 'SERVICES_BATCH_SUB_REQUEST_META', (
+    'HTTP_AUTHORIZATION', 'HTTP_COOKIE', 'HTTP_HOST', 'HTTP_USER_AGENT', 'HTTP_X_REQUEST_ID',
+    'HTTP_X_FORWARDED_FOR', 'HTTP_X_FORWARDED_PROTO', 'HTTP_X_FORWARDED_HOST', 'HTTP_X_SERVICES_CAMEL',
+    'REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL', 'HTTPS', 'wsgi.url_scheme')))
+
+
+class BatchController(BaseController):
+
+    @unauthenticated
+    def create(self, request, response):
+        """
+        Run several api calls in one round trip, results come back in the order requested.
+        Each sub request is dispatched with the caller's session and user, and is subject to the
+        same authentication as calling it directly.
+        API Handler: POST /batch
+
+        Params:
+          @requests [list] list of {"method": "GET", "path": "/foo?bar=1", "body": {...}} (the payload may also just be this list)
+          @parallel [bool] (optional) run the sub requests concurrently, only use when they don't depend on each other
+
+        Returns:
+          @results [list] one {"status": 200, "body": ...} per sub request
+        """
+        payload = request.payload
+        parallel = False
+        if isinstance(payload, dict):
+            parallel = str_to_bool(payload.get('parallel'))
+            payload = payload.get('requests')
+
+        if not isinstance(payload, list) or not payload:
+            return response.bad_request("Expected a list of requests")
+
+        if len(payload) > MAX_REQUESTS:
+            return response.bad_request("A batch may contain at most %s requests" % MAX_REQUESTS)
+
+        if parallel and len(payload) > 1:
+            pool = ThreadPool(min(MAX_WORKERS, len(payload)))
+            try:
+                results = pool.map(lambda sub_request: self.run_in_thread(request, sub_request), payload)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self.run_sub_request(request, sub_request) for sub_request in payload]
+
+        response.set(results=results)
+
+    def run_in_thread(self, request, sub_request):
+        try:
+            return self.run_sub_request(request, sub_request)
+        finally:
+            # pool threads get their own connections, don't leak them
+            connections.close_all()
+
+    def run_sub_request(self, request, sub_request):
+        if not isinstance(sub_request, dict) or not sub_request.get('path'):
+            return self.sub_result(400, "Invalid request, path required")
+
+        method = str(sub_request.get('method', 'GET')).upper()
+        url = urlparse(sub_request['path'])
+
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            return self.sub_result(404, "Not Found")
+
+        # only services endpoints, and no batches of batches
+        if not isinstance(match.func, BaseController) or isinstance(match.func, BatchController):
+            return self.sub_result(400, "%s can not be batched" % url.path)
+
+        sub_http_request = self.build_sub_request(request, method, url, sub_request.get('body'))
+        http_response = match.func(sub_http_request, *match.args, **match.kwargs)
+        return self.sub_result(http_response.status_code, self.decode_body(http_response))
+
+    def build_sub_request(self, request, method, url, body):
+        """
+        A new HttpRequest for the sub request that shares the batch request's session and user
+        """
+        sub_request = HttpRequest()
+        sub_request.method = method
+        sub_request.path = sub_request.path_info = url.path
+        sub_request.GET = QueryDict(url.query)
+        sub_request.POST = QueryDict('')
+        sub_request.COOKIES = request.COOKIES
+        sub_request.user = request.user
+        if hasattr(request, 'session'):
+            sub_request.session = request.session
+
+        sub_request._body = json.dumps(body) if body is not None else ''
+
+        # only what identifies the caller, content negotiation (Accept, Accept-Encoding) and conditional
+        # headers are for the batch response, the sub responses have to come back as plain JSON
+        meta = dict((key, value) for key, value in request.META.items() if key in SUB_REQUEST_META)
+        meta.update({'REQUEST_METHOD': method,
+                     'PATH_INFO': url.path,
+                     'QUERY_STRING': url.query,
+                     'CONTENT_TYPE': 'application/json',
+                     'CONTENT_LENGTH': str(len(sub_request._body))})
+        sub_request.META = meta
+        return sub_request
+
+    def decode_body(self, http_response):
+        if http_response.streaming:
+            content = ''.join(http_response.streaming_content)
+        else:
+            content = http_response.content
+        if content and 'application/json' in http_response.get('Content-Type', ''):
+            try:
+                return json.loads(content)
+            except ValueError:
+                pass
+        return content
+
+    def sub_result(self, status, body):
+        return {'status': status, 'body': body}
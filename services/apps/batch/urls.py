@@ -0,0 +1,6 @@
+from django.conf.urls import url
+from services.apps.batch.controllers import BatchController
+
+urlpatterns = [url(r'^batch/?$', BatchController()),
+
+               ]
@@ -61,11 +61,21 @@ class ServerDeclaration():
             if view:
 
                 if hasattr(view, 'auto_page') and getattr(view, 'paging', False):
-                    method_dict['params'].append(
-                        {'name': 'page_number', 'type': 'int', 'comment': "Page number"})
+                    if getattr(view, 'paging_mode', 'offset') == 'cursor':
+                        method_dict['params'].append(
+                            {'name': 'cursor', 'type': 'string',
+                             'comment': "(optional) next_cursor or prev_cursor from the previous page"})
+                    else:
+                        method_dict['params'].append(
+                            {'name': 'page_number', 'type': 'int', 'comment': "Page number"})
                     method_dict['params'].append(
                         {'name': 'limit', 'type': 'int', 'comment': "Page Size"})
 
+                model_view = getattr(view, 'model_view', view)
+                if hasattr(model_view, 'get_requested_fields'):
+                    method_dict['params'].append(
+                        {'name': 'fields', 'type': 'string', 'comment': "(optional) Comma separated fields to return"})
+
             ret.append(method_dict)
 
         return ret
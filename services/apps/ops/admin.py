@@ -1,7 +1,43 @@
+import json
+
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
 from services.apps.ops import models
 from django.db.models.base import ModelBase
 
+
+class SlowRequestAdmin(admin.ModelAdmin):
+    list_display = ('when', 'endpoint', 'request_method', 'path', 'status_code', 'duration_ms', 'query_count',
+                    'reason')
+    list_filter = ('reason', 'endpoint', 'status_code')
+    search_fields = ('path', 'request_id')
+    date_hierarchy = 'when'
+    readonly_fields = ('function_table', 'query_table', 'timing_table')
+    exclude = ('functions', 'queries', 'timings')
+
+    def function_table(self, obj):
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+                                ((f['function'], f['calls'] if f['calls'] is not None else '',
+                                  '%.1f' % f['self_ms'], '%.1f' % f['total_ms']) for f in json.loads(obj.functions)))
+        return format_html('<table><tr><th>function</th><th>calls</th><th>self ms</th><th>total ms</th></tr>'
+                           '{}</table>', rows)
+    function_table.short_description = 'Hot functions'
+
+    def query_table(self, obj):
+        rows = format_html_join('', '<tr><td>{}</td><td><code>{}</code></td></tr>',
+                                (('%.1f' % q['ms'], q['sql']) for q in json.loads(obj.queries)))
+        return format_html('<table><tr><th>ms</th><th>sql</th></tr>{}</table>', rows)
+    query_table.short_description = 'SQL'
+
+    def timing_table(self, obj):
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td></tr>',
+                                ((phase, '%.1f' % ms) for phase, ms in
+                                 sorted(json.loads(obj.timings).items(), key=lambda item: -item[1])))
+        return format_html('<table><tr><th>phase</th><th>ms</th></tr>{}</table>', rows)
+    timing_table.short_description = 'Timings'
+
+admin.site.register(models.SlowRequest, SlowRequestAdmin)
+
 for model_name in dir(models):
     m = getattr(models, model_name)
     if isinstance(m, ModelBase) and not m._meta.abstract:
@@ -0,0 +1,79 @@
+"""
+The background threads behind the event log, health checks, error report aggregation and the stack sampler
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.db import connection
+
+logger = logging.getLogger('default')
+
+
+class BackgroundThread(object):
+
+    """
+    A daemon thread running `target`, started by the first ensure() in each process
+    """
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self.thread = None
+        self.pid = None
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        # a forked worker doesn't inherit the thread, it needs its own
+        if self.is_running():
+            return
+        with self._lock:
+            if not self.is_running():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.target, name=self.name)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def is_running(self):
+        """
+        Whether the thread was started in this process
+        """
+        return self.thread is not None and self.pid == os.getpid()
+
+    def join(self, timeout):
+        if self.is_running():
+            self.thread.join(timeout)
+
+
+# set at exit, the modules are emptied soon after while the threads may still be running
+_exiting = threading.Event()
+atexit.register(_exiting.set)
+
+
+def repeat(interval, func):
+    """
+    Calls `func` every `interval` seconds until the process exits, an error doesn't stop it
+    """
+    # kept from the modules, see _exiting
+    sleep, exiting, name = time.sleep, _exiting, threading.current_thread().name
+    while True:
+        sleep(interval)
+        if exiting.is_set():
+            return
+        try:
+            func()
+        except Exception as e:
+            if exiting.is_set():
+                # most likely what func needed was emptied
+                return
+            log_error("%s failed: %s" % (name, e))
+
+
+def log_error(message):
+    """
+    Logs an error from a background round, closing the connection so the next round doesn't get a broken one
+    """
+    logger.error(message)
+    connection.close()
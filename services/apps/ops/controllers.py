@@ -1,11 +1,12 @@
 from services.controller import BaseController
 import datetime
 import socket
-from django.contrib.auth.models import User
 from django.conf import settings
-from django.core.mail import send_mail
-from services.apps.ops.models import ErrorReport
+from django.http import HttpResponse
 from services import utils
+from services import metrics, timing
+from services.apps.ops import error_reports, health
+from services.decorators import unauthenticated
 import logging
 logger = logging.getLogger('default')
 
@@ -13,28 +14,53 @@ class StatusController(BaseController):
 
     def read(self, request, response):
         """
-        Server status endpoint
+        Server status endpoint, the results of the last round of background health checks
         API Handler: GET /ops/status
+
+        Returns:
+          checks: {name: {ok, latency_ms, error, checked_at, age}} for each check in SERVICES_HEALTH_CHECKS,
+          age is the number of seconds since it ran
+          healthy: whether every check passed
         """
-        sql_connectivity = True
-        sdb_connectivity = True
+        checks = health.get_prober().status()
 
-        try:
-            import pycassa
-            pycassa.pool.ConnectionPool(settings.DEFAULT_CASSANDRA_KEYSPACE, settings.CASSANDRA_SERVERS)
-        except:
-            sdb_connectivity = False
+        response.set(checks=checks)
+        response.set(healthy=all(check and check['ok'] for check in checks.values()))
+        sdb, sql = checks.get('cassandra'), checks.get('sql')
+        response.set(sdb_connectivity=bool(sdb and sdb['ok']))
+        response.set(sql_connectivity=bool(sql and sql['ok']))
+        response.set(timestamp=datetime.datetime.utcnow())
+        response.set(hostname=socket.gethostname())
 
-        try:
-            User.objects.filter(id=1)
-        except:
-            sql_connectivity = False
+class LatencyController(BaseController):
 
-        response.set(sdb_connectivity=sdb_connectivity)
-        response.set(sql_connectivity=sql_connectivity)
+    def read(self, request, response):
+        """
+        Latency percentiles for every endpoint and dispatch phase this process has served
+        API Handler: GET /ops/latency
+
+        Returns, in milliseconds per endpoint and phase: count, max, p50, p95, p99
+        """
+        response.set(endpoints=timing.latency_stats())
         response.set(timestamp=datetime.datetime.utcnow())
         response.set(hostname=socket.gethostname())
 
+class MetricsController(BaseController):
+    internal = True
+
+    @unauthenticated
+    def read(self, request, response):
+        """
+        Counters and histograms for every worker, in the Prometheus text format
+        API Handler: GET /ops/metrics
+
+        When SERVICES_METRICS_TOKEN is set, scrapers send it as "Authorization: Bearer <token>"
+        """
+        token = getattr(settings, 'SERVICES_METRICS_TOKEN', None)
+        if token and request.META.get('HTTP_AUTHORIZATION') != 'Bearer %s' % token:
+            return response.access_denied()
+        return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4')
+
 class DeployController(BaseController):
      pass
 
@@ -50,7 +76,8 @@ class ErrorReportController(BaseController):
 
     def create(self, request, response):
         """
-        Report an error or timeout to the server
+        Report an error or timeout to the server, reports of the same error are counted together and
+        saved, and mailed about, in the background
         API Handler: POST /ops/error
 
         Params:
@@ -59,18 +86,10 @@ class ErrorReportController(BaseController):
           @when [datetime] timestamp for when the thing happened
         """
         try:
-            report = request.POST.get('report')
+            report = request.POST.get('report') or ''
             request_id = request.POST.get('request_id')
             when = utils.default_time_parse(request.POST.get('when', ''))
-            send_mail("Error Report", report, 'ops@canwecode.com', [a[1] for a in settings.ADMINS], fail_silently=True)
-            if request.user.is_authenticated():
-                profile = request.user.get_profile()
-                report += '\n%s %s' % (profile.name, profile.id)
-                ErrorReport.objects.create(report=report, request_id=request_id, when=when,
-                        profile_id=request.user.get_profile().id)
-            else:
-                ErrorReport.objects.create(report=report, request_id=request_id, when=when)
+            profile_id = request.user.pk if request.user.is_authenticated() else None
+            error_reports.get_aggregator().add(report, request_id=request_id, when=when, profile_id=profile_id)
         except Exception,  e:
             logger.error(e)
-
-
@@ -0,0 +1,149 @@
+"""
+Aggregated ErrorReport ingestion for POST /ops/error
+
+Reports are fingerprinted by their text with the ids, numbers and addresses taken out, and counted in
+memory. Every SERVICES_ERROR_REPORT_WINDOW seconds a background thread saves one ErrorReport per fingerprint
+seen, with the count and the first report as the sample, and mails ADMINS a single digest of the
+fingerprints that had never been seen before. A bad release reporting the same error from every device
+makes one row a window and one email.
+
+    SERVICES_ERROR_REPORT_WINDOW        seconds reports are counted for before being saved (60)
+    SERVICES_ERROR_REPORT_MAX_PENDING   distinct fingerprints held a window, reports of others are
+                                        dropped (1000)
+    SERVICES_ERROR_REPORT_DIGEST_SIZE   new fingerprints listed in a digest, most reported first (20)
+    SERVICES_ERROR_REPORT_FROM          the digest's sender (ops@canwecode.com)
+"""
+import atexit
+import datetime
+import hashlib
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import send_mail
+
+from services.apps.ops.background import BackgroundThread, log_error, repeat
+
+CLAIM_PREFIX = 'services:error_report:'
+# by then the ErrorReport rows say whether a fingerprint is new
+CLAIM_TIMEOUT = 60 * 60 * 24
+
+_variable_parts = [
+    (re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.I), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-f]+\b', re.I), '<hex>'),
+    (re.compile(r'\b[0-9a-f]{16,}\b', re.I), '<hex>'),
+    (re.compile(r'\d+(\.\d+)?'), '<n>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalize(report):
+    """
+    `report` without the parts that change between two reports of the same error
+    """
+    for pattern, replacement in _variable_parts:
+        report = pattern.sub(replacement, report)
+    return report.strip().lower()
+
+
+def fingerprint(report):
+    return hashlib.sha1(normalize(report).encode('utf-8')).hexdigest()
+
+
+class ErrorReportAggregator(object):
+
+    def __init__(self, window=60, max_pending=1000, digest_size=20):
+        self.window = window
+        self.max_pending = max_pending
+        self.digest_size = digest_size
+        # fingerprint -> {'report', 'request_id', 'profile_id', 'when', 'last_seen', 'count'}
+        self.pending = {}
+        # fingerprints this process has already saved, which the database doesn't need asking about
+        self.known = set()
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self.thread = BackgroundThread(self.run, 'ErrorReportAggregator')
+
+    def add(self, report, request_id=None, when=None, profile_id=None):
+        """
+        Counts a report, returns its fingerprint, None when it was dropped
+        """
+        key = fingerprint(report)
+        now = datetime.datetime.utcnow()
+        self.thread.ensure()
+        with self._lock:
+            pending = self.pending.get(key)
+            if pending is None:
+                if len(self.pending) >= self.max_pending:
+                    self.dropped += 1
+                    return None
+                pending = self.pending[key] = {'report': report, 'request_id': request_id or '',
+                                               'profile_id': profile_id, 'when': when or now, 'count': 0}
+            pending['count'] += 1
+            pending['last_seen'] = now
+        return key
+
+    def run(self):
+        repeat(self.window, self.flush)
+
+    def flush(self):
+        """
+        Saves what's been counted and mails the digest of new fingerprints, from the calling thread
+        """
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        try:
+            new = self.save(pending)
+        except Exception as e:
+            log_error("Dropped %d error reports: %s" % (sum(p['count'] for p in pending.values()), e))
+            return
+        if new:
+            self.send_digest(new)
+
+    def save(self, pending):
+        """
+        Writes a row per fingerprint, returns [(fingerprint, pending)] for the ones never saved before.
+        Other workers may be saving the same new fingerprints, the one to claim it in the cache gets to mail it
+        """
+        from services.apps.ops.models import ErrorReport
+
+        unknown = [key for key in pending if key not in self.known]
+        seen = set(ErrorReport.objects.filter(fingerprint__in=unknown).values_list('fingerprint', flat=True))
+        ErrorReport.objects.bulk_create([ErrorReport(fingerprint=key, **values)
+                                         for key, values in pending.items()])
+        self.known.update(pending)
+        return [(key, pending[key]) for key in unknown if key not in seen and
+                cache.add(CLAIM_PREFIX + key, 1, CLAIM_TIMEOUT)]
+
+    def send_digest(self, new):
+        new = sorted(new, key=lambda item: item[1]['count'], reverse=True)
+        lines = ["%d new error report%s in the last %d seconds" % (len(new), 's' if len(new) > 1 else '',
+                                                                    self.window)]
+        for key, values in new[:self.digest_size]:
+            lines.append('\n%s, reported %d times, first at %s\n%s' % (key, values['count'], values['when'],
+                                                                        values['report']))
+        if len(new) > self.digest_size:
+            lines.append('\nand %d more' % (len(new) - self.digest_size))
+        send_mail("Error Reports", '\n'.join(lines), getattr(settings, 'SERVICES_ERROR_REPORT_FROM',
+                                                              'ops@canwecode.com'),
+                  [a[1] for a in settings.ADMINS], fail_silently=True)
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator():
+    global _aggregator
+    if _aggregator is None:
+        with _aggregator_lock:
+            if _aggregator is None:
+                _aggregator = ErrorReportAggregator(
+                    window=getattr(settings, 'SERVICES_ERROR_REPORT_WINDOW', 60),
+                    max_pending=getattr(settings, 'SERVICES_ERROR_REPORT_MAX_PENDING', 1000),
+                    digest_size=getattr(settings, 'SERVICES_ERROR_REPORT_DIGEST_SIZE', 20))
+                atexit.register(_aggregator.flush)
+    return _aggregator
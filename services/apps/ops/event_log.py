@@ -0,0 +1,221 @@
+"""
+Buffered EventLog writing, in place of a log_api_interaction task per request
+
+Interactions are queued in memory and a background thread saves them with bulk_create, a batch at a
+time, at least every flush interval. Request threads never wait on it: when the queue is full the
+interaction is dropped and counted. With SERVICES_EVENT_LOG = True, BaseController logs every request.
+Where the rows go is up to partitions.insert.
+
+    SERVICES_EVENT_LOG_SAMPLE_RATE      fraction of successful requests kept, errors are always kept (1.0)
+    SERVICES_EVENT_LOG_MAX_BODY         request and response bodies are cut to this many characters (4096)
+    SERVICES_EVENT_LOG_BATCH_SIZE       rows per INSERT (100)
+    SERVICES_EVENT_LOG_FLUSH_INTERVAL   seconds a row may wait in the queue (1.0)
+    SERVICES_EVENT_LOG_MAX_QUEUE        rows held before new ones are dropped (10000)
+"""
+import Queue
+import atexit
+import datetime
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from services.apps.ops.background import BackgroundThread, log_error
+
+FIELD_LENGTHS = {
+    'request_id': 256,
+    'session_id': 128,
+    'host': 128,
+    'path': 256,
+    'request_method': 8,
+    'query_string': 256,
+    'status_code': 3,
+}
+
+
+def is_enabled():
+    return getattr(settings, 'SERVICES_EVENT_LOG', False)
+
+
+def text_body(value):
+    """
+    `value` as unicode, empty for binary bodies (msgpack, gzip, uploads)
+    """
+    if not value:
+        return u''
+    if isinstance(value, unicode):
+        return value
+    try:
+        return str(value).decode('utf-8')
+    except UnicodeDecodeError:
+        return u''
+
+
+class EventLogWriter(object):
+
+    def __init__(self, batch_size=100, flush_interval=1.0, max_queue=10000, sample_rate=1.0, max_body=4096):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.max_body = max_body
+        self.queue = Queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.thread = BackgroundThread(self.run, 'EventLogWriter')
+        self._closed = False
+        # held while a batch is being saved, so flush() can wait out the background thread
+        self._write_lock = threading.Lock()
+
+    def log(self, **kwargs):
+        """
+        Queues an interaction, takes the same arguments as tasks.log_api_interaction
+        """
+        status_code = str(kwargs.get('status_code', ''))
+        if self.sample_rate < 1 and status_code[:1] not in ('4', '5') and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return False
+
+        row = self.clean(kwargs)
+        self.thread.ensure()
+        try:
+            self.queue.put_nowait(row)
+        except Queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def clean(self, kwargs):
+        row = {}
+        for name, length in FIELD_LENGTHS.items():
+            value = kwargs.get(name)
+            row[name] = value[:length] if isinstance(value, basestring) else (value if value is not None else '')
+        row['status_code'] = str(kwargs.get('status_code', ''))[:FIELD_LENGTHS['status_code']]
+        row['profile_id'] = kwargs.get('profile_id')
+        row['when'] = kwargs.get('when') or datetime.datetime.utcnow()
+        for name in ('request_body', 'response_body'):
+            row[name] = text_body(kwargs.get(name))[:self.max_body]
+        return row
+
+    def take_batch(self, timeout):
+        """
+        Up to batch_size queued rows, waiting at most `timeout` seconds to fill the batch
+        """
+        batch = []
+        deadline = time.time() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining <= 0:
+                    row = self.queue.get_nowait()
+                else:
+                    row = self.queue.get(timeout=remaining)
+            except Queue.Empty:
+                break
+            # None is put by close() to wake the thread up
+            if row is None:
+                break
+            batch.append(row)
+        return batch
+
+    def run(self):
+        while not self._closed:
+            batch = self.take_batch(self.flush_interval)
+            if batch:
+                with self._write_lock:
+                    self.write(batch)
+
+    def write(self, batch):
+        from services.apps.ops import partitions
+        try:
+            partitions.insert(batch, self.batch_size)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            log_error("Dropped %d event log rows: %s" % (len(batch), e))
+
+    def flush(self):
+        """
+        Writes everything queued, from the calling thread
+        """
+        with self._write_lock:
+            while True:
+                batch = self.take_batch(0)
+                if not batch:
+                    break
+                self.write(batch)
+
+    def close(self):
+        """
+        Stops the background thread and writes what's left, at exit
+        """
+        self._closed = True
+        if self.thread.is_running():
+            try:
+                self.queue.put_nowait(None)
+            except Queue.Full:
+                pass
+            self.thread.join(self.flush_interval + 1)
+        self.flush()
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'written': self.written, 'dropped': self.dropped,
+                'sampled_out': self.sampled_out}
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = EventLogWriter(
+                    batch_size=getattr(settings, 'SERVICES_EVENT_LOG_BATCH_SIZE', 100),
+                    flush_interval=getattr(settings, 'SERVICES_EVENT_LOG_FLUSH_INTERVAL', 1.0),
+                    max_queue=getattr(settings, 'SERVICES_EVENT_LOG_MAX_QUEUE', 10000),
+                    sample_rate=getattr(settings, 'SERVICES_EVENT_LOG_SAMPLE_RATE', 1.0),
+                    max_body=getattr(settings, 'SERVICES_EVENT_LOG_MAX_BODY', 4096))
+                atexit.register(_writer.close)
+    return _writer
+
+
+def log_api_interaction(**kwargs):
+    return get_writer().log(**kwargs)
+
+
+def log_request(request, http_response):
+    """
+    Queues the EventLog row for a request BaseController has answered
+    """
+    user = getattr(request, 'user', None)
+    session = getattr(request, 'session', None)
+    try:
+        request_body = request.body
+    except Exception:
+        # already read as a stream (multipart uploads)
+        request_body = ''
+
+    response_body = ''
+    if http_response is not None and not getattr(http_response, 'streaming', False):
+        # the body from before compression, which BaseView and ResponseCache keep on the response
+        response_body = getattr(http_response, 'uncompressed_content', None)
+        if response_body is None:
+            response_body = '' if http_response.has_header('Content-Encoding') else http_response.content
+
+    return log_api_interaction(
+        request_id=request.META.get('HTTP_X_REQUEST_ID') or getattr(request, 'request_id', None),
+        profile_id=user.pk if user is not None and user.is_authenticated() else None,
+        session_id=session.session_key if session is not None else None,
+        # not get_host(), which raises for hosts outside ALLOWED_HOSTS
+        host=request.META.get('HTTP_HOST') or request.META.get('SERVER_NAME', ''),
+        path=request.path,
+        request_method=request.method,
+        query_string=request.META.get('QUERY_STRING', ''),
+        request_body=request_body,
+        response_body=response_body,
+        status_code=getattr(http_response, 'status_code', ''),
+        when=datetime.datetime.utcnow())
@@ -0,0 +1,183 @@
+"""
+Backend health checks for GET /ops/status, run by a background thread so the endpoint only reads the last
+results
+
+    SERVICES_HEALTH_CHECKS      names of the checks to run, from CHECKS (sql, cache, and cassandra when
+                                CASSANDRA_SERVERS is set)
+    SERVICES_HEALTH_INTERVAL    seconds between rounds of checks (5)
+    SERVICES_HEALTH_TIMEOUT     seconds a check may take before it counts as failed (2)
+
+A check that's still hanging from the last round isn't started again, it keeps failing until it returns.
+"""
+import datetime
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from services.apps.ops.background import BackgroundThread, repeat
+
+_cassandra_pool = None
+
+
+def check_sql():
+    for connection in connections.all():
+        cursor = connection.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_cache():
+    from django.core.cache import caches
+    key = 'services_health_%d' % os.getpid()
+    for alias, options in settings.CACHES.items():
+        # DummyCache never keeps anything
+        if options['BACKEND'].endswith('DummyCache'):
+            continue
+        cache = caches[alias]
+        cache.set(key, 1, 60)
+        if cache.get(key) != 1:
+            raise Exception("the %s cache didn't keep a value" % alias)
+
+
+def check_cassandra():
+    global _cassandra_pool
+    import pycassa
+    # one pool for the life of the process, connecting is the expensive part
+    if _cassandra_pool is None:
+        _cassandra_pool = pycassa.pool.ConnectionPool(settings.DEFAULT_CASSANDRA_KEYSPACE,
+                                                      settings.CASSANDRA_SERVERS, pool_size=1,
+                                                      timeout=get_timeout())
+    connection = _cassandra_pool.get()
+    try:
+        connection.describe_version()
+    finally:
+        connection.return_to_pool()
+
+
+def check_mongo():
+    from services.data import dataview
+    dataview.connection.admin.command('ping')
+
+
+CHECKS = {
+    'sql': check_sql,
+    'cache': check_cache,
+    'cassandra': check_cassandra,
+    'mongo': check_mongo,
+}
+
+
+def get_checks():
+    names = getattr(settings, 'SERVICES_HEALTH_CHECKS', None)
+    if names is None:
+        names = ['sql', 'cache']
+        if getattr(settings, 'CASSANDRA_SERVERS', None):
+            names.append('cassandra')
+    return names
+
+
+def get_timeout():
+    return getattr(settings, 'SERVICES_HEALTH_TIMEOUT', 2)
+
+
+class HealthProber(object):
+
+    def __init__(self, interval=5, timeout=2):
+        self.interval = interval
+        self.timeout = timeout
+        # name -> {'ok', 'latency_ms', 'error', 'checked_at'}
+        self.results = {}
+        # name -> the thread running it
+        self.running = {}
+        # rounds of checks finished
+        self.rounds = 0
+        self._round_lock = threading.Lock()
+        self.thread = BackgroundThread(self.run, 'HealthProber')
+
+    def run(self):
+        repeat(self.interval, self.probe)
+
+    def probe(self):
+        """
+        Runs every check at once, waiting at most the timeout for them
+        """
+        with self._round_lock:
+            self._probe()
+
+    def _probe(self):
+        started = {}
+        for name in get_checks():
+            thread = self.running.get(name)
+            if thread is not None and thread.is_alive():
+                self.results[name] = result(False, (time.time() - thread.started) * 1000,
+                                            "still running from a previous round")
+                continue
+            thread = self.running[name] = threading.Thread(target=self.run_check, args=(name,),
+                                                           name='HealthCheck-%s' % name)
+            thread.daemon = True
+            thread.started = time.time()
+            thread.start()
+            started[name] = thread
+
+        deadline = time.time() + self.timeout
+        for name, thread in started.items():
+            thread.join(max(0, deadline - time.time()))
+            if thread.is_alive():
+                self.results[name] = result(False, self.timeout * 1000, "timed out")
+        self.rounds += 1
+
+    def run_check(self, name):
+        start = time.time()
+        try:
+            CHECKS[name]()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e) or e.__class__.__name__
+        finally:
+            # the connections were opened for this thread, nothing else will close them
+            for connection in connections.all():
+                connection.close()
+        # a check that timed out doesn't get to overwrite that
+        if time.time() - start <= self.timeout:
+            self.results[name] = result(ok, (time.time() - start) * 1000, error)
+
+    def status(self):
+        """
+        {name: {'ok', 'latency_ms', 'error', 'checked_at', 'age'}}, age being the seconds since it ran
+        """
+        self.thread.ensure()
+        if not self.rounds:
+            # first request in this process, there's nothing to serve yet. Requests arriving while it's
+            # probing wait for its round rather than start their own and find the checks still running
+            with self._round_lock:
+                if not self.rounds:
+                    self._probe()
+        now = datetime.datetime.utcnow()
+        ret = {}
+        for name in get_checks():
+            check = self.results.get(name)
+            if check is not None:
+                check = dict(check, age=(now - check['checked_at']).total_seconds())
+            ret[name] = check
+        return ret
+
+
+def result(ok, latency_ms, error=None):
+    return {'ok': ok, 'latency_ms': latency_ms, 'error': error, 'checked_at': datetime.datetime.utcnow()}
+
+
+_prober = None
+_prober_lock = threading.Lock()
+
+
+def get_prober():
+    global _prober
+    if _prober is None:
+        with _prober_lock:
+            if _prober is None:
+                _prober = HealthProber(interval=getattr(settings, 'SERVICES_HEALTH_INTERVAL', 5),
+                                       timeout=get_timeout())
+    return _prober
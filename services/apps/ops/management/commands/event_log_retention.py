@@ -0,0 +1,27 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from services.apps.ops import partitions
+
+
+class Command(BaseCommand):
+    """
+    Drops the EventLog days past retention and compacts the older ones, meant to be run daily from cron
+    Usage: ./manage.py event_log_retention [--days=30] [--compact-days=7]
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--days', type='int', dest='days', default=None,
+                    help='Days of EventLog to keep, SERVICES_EVENT_LOG_RETENTION_DAYS by default'),
+        make_option('--compact-days', type='int', dest='compact_days', default=None,
+                    help='Remove the bodies of successful requests older than this many days, '
+                         'SERVICES_EVENT_LOG_COMPACT_DAYS by default'),
+    )
+    help = 'Drop and compact old EventLog partitions'
+
+    def handle(self, *args, **options):
+        dropped, compacted = partitions.apply_retention(options['days'], options['compact_days'])
+        for name in dropped:
+            self.stdout.write('dropped %s' % name)
+        for name in compacted:
+            self.stdout.write('compacted %s' % name)
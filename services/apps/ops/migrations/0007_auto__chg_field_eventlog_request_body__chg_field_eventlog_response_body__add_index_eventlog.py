@@ -0,0 +1,67 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Changing field 'EventLog.request_body' and 'EventLog.response_body', existing rows are kept as
+        # uncompressed bytes, which CompressedTextField still reads
+        for column in ('request_body', 'response_body'):
+            if db.backend_name == 'postgres':
+                db.execute('ALTER TABLE "ops_eventlog" ALTER COLUMN "%s" TYPE bytea USING convert_to("%s", \'UTF8\')'
+                           % (column, column))
+            else:
+                db.alter_column('ops_eventlog', column, self.gf('services.apps.ops.models.CompressedTextField')(default='', blank=True))
+
+        # Adding index on 'EventLog', fields ['when', 'path', 'status_code']
+        db.create_index('ops_eventlog', ['when', 'path', 'status_code'])
+
+
+    def backwards(self, orm):
+        
+        # Removing index on 'EventLog', fields ['when', 'path', 'status_code']
+        db.delete_index('ops_eventlog', ['when', 'path', 'status_code'])
+
+        # Changing field 'EventLog.request_body' and 'EventLog.response_body', compressed rows can't be
+        # read back as text, they're emptied
+        for column in ('request_body', 'response_body'):
+            if db.backend_name == 'postgres':
+                db.execute('ALTER TABLE "ops_eventlog" ALTER COLUMN "%s" TYPE varchar(1000000) USING '
+                           'CASE WHEN encode(substring("%s" from 1 for 1), \'hex\') = \'78\' THEN \'\' '
+                           'ELSE convert_from("%s", \'UTF8\') END'
+                           % (column, column, column))
+            else:
+                db.alter_column('ops_eventlog', column, self.gf('django.db.models.fields.CharField')(max_length=1000000))
+
+
+    models = {
+        'ops.errorreport': {
+            'Meta': {'object_name': 'ErrorReport'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'profile_id': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'report': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'request_id': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'when': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'})
+        },
+        'ops.eventlog': {
+            'Meta': {'object_name': 'EventLog', 'index_together': "[('when', 'path', 'status_code')]"},
+            'host': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'path': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'profile_id': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'query_string': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'request_body': ('services.apps.ops.models.CompressedTextField', [], {'default': "''", 'blank': 'True'}),
+            'request_id': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '256', 'blank': 'True'}),
+            'request_method': ('django.db.models.fields.CharField', [], {'max_length': '8'}),
+            'response_body': ('services.apps.ops.models.CompressedTextField', [], {'default': "''", 'blank': 'True'}),
+            'session_id': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'status_code': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'when': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'})
+        }
+    }
+
+    complete_apps = ['ops']
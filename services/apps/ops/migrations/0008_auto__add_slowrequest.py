@@ -0,0 +1,84 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding model 'SlowRequest'
+        db.create_table('ops_slowrequest', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('request_id', self.gf('django.db.models.fields.CharField')(default='', max_length=256, blank=True)),
+            ('endpoint', self.gf('django.db.models.fields.CharField')(max_length=256)),
+            ('path', self.gf('django.db.models.fields.CharField')(max_length=256)),
+            ('request_method', self.gf('django.db.models.fields.CharField')(max_length=8)),
+            ('query_string', self.gf('django.db.models.fields.CharField')(default='', max_length=256, blank=True)),
+            ('status_code', self.gf('django.db.models.fields.CharField')(max_length=3)),
+            ('reason', self.gf('django.db.models.fields.CharField')(max_length=16)),
+            ('duration_ms', self.gf('django.db.models.fields.FloatField')()),
+            ('query_count', self.gf('django.db.models.fields.IntegerField')(null=True)),
+            ('query_ms', self.gf('django.db.models.fields.FloatField')(null=True)),
+            ('samples', self.gf('django.db.models.fields.IntegerField')(null=True)),
+            ('functions', self.gf('django.db.models.fields.TextField')(default='[]', blank=True)),
+            ('queries', self.gf('django.db.models.fields.TextField')(default='[]', blank=True)),
+            ('timings', self.gf('django.db.models.fields.TextField')(default='{}', blank=True)),
+            ('when', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.utcnow, db_index=True)),
+        ))
+        db.send_create_signal('ops', ['SlowRequest'])
+
+
+    def backwards(self, orm):
+        
+        # Deleting model 'SlowRequest'
+        db.delete_table('ops_slowrequest')
+
+
+    models = {
+        'ops.errorreport': {
+            'Meta': {'object_name': 'ErrorReport'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'profile_id': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'report': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'request_id': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'when': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'})
+        },
+        'ops.eventlog': {
+            'Meta': {'object_name': 'EventLog', 'index_together': "[('when', 'path', 'status_code')]"},
+            'host': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'path': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'profile_id': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'query_string': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'request_body': ('services.apps.ops.models.CompressedTextField', [], {'default': "''", 'blank': 'True'}),
+            'request_id': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '256', 'blank': 'True'}),
+            'request_method': ('django.db.models.fields.CharField', [], {'max_length': '8'}),
+            'response_body': ('services.apps.ops.models.CompressedTextField', [], {'default': "''", 'blank': 'True'}),
+            'session_id': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'status_code': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'when': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'})
+        },
+        'ops.slowrequest': {
+            'Meta': {'object_name': 'SlowRequest'},
+            'duration_ms': ('django.db.models.fields.FloatField', [], {}),
+            'endpoint': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'functions': ('django.db.models.fields.TextField', [], {'default': "'[]'", 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'path': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'queries': ('django.db.models.fields.TextField', [], {'default': "'[]'", 'blank': 'True'}),
+            'query_count': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'query_ms': ('django.db.models.fields.FloatField', [], {'null': 'True'}),
+            'query_string': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '256', 'blank': 'True'}),
+            'reason': ('django.db.models.fields.CharField', [], {'max_length': '16'}),
+            'request_id': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '256', 'blank': 'True'}),
+            'request_method': ('django.db.models.fields.CharField', [], {'max_length': '8'}),
+            'samples': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'status_code': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'timings': ('django.db.models.fields.TextField', [], {'default': "'{}'", 'blank': 'True'}),
+            'when': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow', 'db_index': 'True'})
+        }
+    }
+
+    complete_apps = ['ops']
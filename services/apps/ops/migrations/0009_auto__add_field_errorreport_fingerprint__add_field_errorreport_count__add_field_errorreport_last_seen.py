@@ -0,0 +1,81 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding field 'ErrorReport.fingerprint'
+        db.add_column('ops_errorreport', 'fingerprint', self.gf('django.db.models.fields.CharField')(default='', max_length=40, db_index=True, blank=True), keep_default=False)
+
+        # Adding field 'ErrorReport.count'
+        db.add_column('ops_errorreport', 'count', self.gf('django.db.models.fields.IntegerField')(default=1), keep_default=False)
+
+        # Adding field 'ErrorReport.last_seen'
+        db.add_column('ops_errorreport', 'last_seen', self.gf('django.db.models.fields.DateTimeField')(null=True), keep_default=False)
+
+
+    def backwards(self, orm):
+        
+        # Deleting field 'ErrorReport.fingerprint'
+        db.delete_column('ops_errorreport', 'fingerprint')
+
+        # Deleting field 'ErrorReport.count'
+        db.delete_column('ops_errorreport', 'count')
+
+        # Deleting field 'ErrorReport.last_seen'
+        db.delete_column('ops_errorreport', 'last_seen')
+
+
+    models = {
+        'ops.errorreport': {
+            'Meta': {'object_name': 'ErrorReport'},
+            'count': ('django.db.models.fields.IntegerField', [], {'default': '1'}),
+            'fingerprint': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '40', 'db_index': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_seen': ('django.db.models.fields.DateTimeField', [], {'null': 'True'}),
+            'profile_id': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'report': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'request_id': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'when': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'})
+        },
+        'ops.eventlog': {
+            'Meta': {'object_name': 'EventLog', 'index_together': "[('when', 'path', 'status_code')]"},
+            'host': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'path': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'profile_id': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'query_string': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'request_body': ('services.apps.ops.models.CompressedTextField', [], {'default': "''", 'blank': 'True'}),
+            'request_id': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '256', 'blank': 'True'}),
+            'request_method': ('django.db.models.fields.CharField', [], {'max_length': '8'}),
+            'response_body': ('services.apps.ops.models.CompressedTextField', [], {'default': "''", 'blank': 'True'}),
+            'session_id': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'status_code': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'when': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'})
+        },
+        'ops.slowrequest': {
+            'Meta': {'object_name': 'SlowRequest'},
+            'duration_ms': ('django.db.models.fields.FloatField', [], {}),
+            'endpoint': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'functions': ('django.db.models.fields.TextField', [], {'default': "'[]'", 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'path': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'queries': ('django.db.models.fields.TextField', [], {'default': "'[]'", 'blank': 'True'}),
+            'query_count': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'query_ms': ('django.db.models.fields.FloatField', [], {'null': 'True'}),
+            'query_string': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '256', 'blank': 'True'}),
+            'reason': ('django.db.models.fields.CharField', [], {'max_length': '16'}),
+            'request_id': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '256', 'blank': 'True'}),
+            'request_method': ('django.db.models.fields.CharField', [], {'max_length': '8'}),
+            'samples': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'status_code': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'timings': ('django.db.models.fields.TextField', [], {'default': "'{}'", 'blank': 'True'}),
+            'when': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow', 'db_index': 'True'})
+        }
+    }
+
+    complete_apps = ['ops']
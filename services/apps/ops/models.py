@@ -1,17 +1,78 @@
+from django import forms
 from django.db import models
 import datetime
+import zlib
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text stored zlib compressed, rows saved as plain text before the column was compressed still read back
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CompressedTextField, self).__init__(*args, **kwargs)
+        # BinaryField isn't editable, the admin should still show the text
+        self.editable = True
+
+    def deconstruct(self):
+        return models.Field.deconstruct(self)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return zlib.compress(value)
+
+    def from_db_value(self, value, expression, connection, context):
+        if value is None or isinstance(value, unicode):
+            return value
+        # a buffer from sqlite3 and psycopg2, a memoryview from some other drivers
+        value = value.tobytes() if isinstance(value, memoryview) else str(value)
+        try:
+            value = zlib.decompress(value)
+        except zlib.error:
+            pass
+        return value.decode('utf-8', 'replace')
+
+    def to_python(self, value):
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        defaults = {'form_class': forms.CharField, 'widget': forms.Textarea, 'required': False}
+        defaults.update(kwargs)
+        return models.Field.formfield(self, **defaults)
+
+try:
+    from south.modelsinspector import add_introspection_rules
+    add_introspection_rules([], [r'^services\.apps\.ops\.models\.CompressedTextField'])
+except ImportError:
+    pass
 
 class ErrorReport(models.Model):
+    """
+    `count` reports with the same fingerprint, from `when` to `last_seen`, see error_reports.py. The other
+    fields are from the first of them.
+    """
     report = models.TextField(blank=True, default='')
     request_id = models.TextField(blank=True, default='')
     profile_id = models.IntegerField(null=True)
     when = models.DateTimeField(default=datetime.datetime.utcnow)
+    fingerprint = models.CharField(max_length=40, blank=True, default='', db_index=True)
+    count = models.IntegerField(default=1)
+    last_seen = models.DateTimeField(null=True)
 
 
     def __unicode__(self):
         return unicode(self.report)
 
 class EventLog(models.Model):
+    """
+    With SERVICES_EVENT_LOG_PARTITIONS on PostgreSQL, rows are saved in a table per day inheriting this
+    one, see partitions.py
+    """
     request_id = models.CharField(max_length=256, blank=True, default='')
     profile_id = models.IntegerField(null=True)
     session_id = models.CharField(max_length=128)
@@ -19,11 +80,14 @@ class EventLog(models.Model):
     path = models.CharField(max_length=256)
     request_method = models.CharField(max_length=8)
     query_string = models.CharField(max_length=256)
-    request_body = models.CharField(max_length=1000000)
-    response_body = models.CharField(max_length=1000000)
+    request_body = CompressedTextField(blank=True, default='')
+    response_body = CompressedTextField(blank=True, default='')
     status_code = models.CharField(max_length=3)
     when = models.DateTimeField(default=datetime.datetime.utcnow)
 
+    class Meta:
+        index_together = [('when', 'path', 'status_code')]
+
     def __unicode__(self):
        ret = "%s %s" % (self.request_method, self.path)
        if self.query_string:
@@ -31,5 +95,25 @@ class EventLog(models.Model):
        ret += ' at ' + str(self.when)
        return ret
 
+class SlowRequest(models.Model):
+    """
+    A profiled request, see profiling.py. functions, queries and timings are JSON.
+    """
+    request_id = models.CharField(max_length=256, blank=True, default='')
+    endpoint = models.CharField(max_length=256)
+    path = models.CharField(max_length=256)
+    request_method = models.CharField(max_length=8)
+    query_string = models.CharField(max_length=256, blank=True, default='')
+    status_code = models.CharField(max_length=3)
+    reason = models.CharField(max_length=16)
+    duration_ms = models.FloatField()
+    query_count = models.IntegerField(null=True)
+    query_ms = models.FloatField(null=True)
+    samples = models.IntegerField(null=True)
+    functions = models.TextField(blank=True, default='[]')
+    queries = models.TextField(blank=True, default='[]')
+    timings = models.TextField(blank=True, default='{}')
+    when = models.DateTimeField(default=datetime.datetime.utcnow, db_index=True)
 
-
+    def __unicode__(self):
+        return "%s %s (%.0fms) at %s" % (self.request_method, self.path, self.duration_ms, self.when)
@@ -0,0 +1,194 @@
+"""
+Day partitioned EventLog storage and retention, see the event_log_retention command
+
+With SERVICES_EVENT_LOG_PARTITIONS = True on PostgreSQL, the rows for each (UTC) day are saved in their own
+table, ops_eventlog_YYYYMMDD, inheriting ops_eventlog: querying EventLog still reads every day, a CHECK on
+"when" lets the planner skip the days outside a time range, and retention drops whole tables instead of
+DELETEing rows. On other databases, or with the setting off, everything goes in ops_eventlog.
+
+    SERVICES_EVENT_LOG_RETENTION_DAYS   days of EventLog kept (30)
+    SERVICES_EVENT_LOG_COMPACT_DAYS     after this many days the bodies of successful requests are
+                                        removed, None to keep them until the day is dropped (None)
+"""
+import datetime
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from services.apps.ops.models import EventLog
+
+PARENT_TABLE = EventLog._meta.db_table
+PARTITION_FORMAT = PARENT_TABLE + '_%Y%m%d'
+_partition_name = re.compile(r'^%s_(\d{8})$' % PARENT_TABLE)
+COMPACTED = 'compacted'
+
+# partitions known to exist, so the writer doesn't ask again for every batch
+_created = set()
+_created_lock = threading.Lock()
+
+
+def is_partitioned():
+    return getattr(settings, 'SERVICES_EVENT_LOG_PARTITIONS', False) and connection.vendor == 'postgresql'
+
+
+def partition_name(day):
+    return day.strftime(PARTITION_FORMAT)
+
+
+def qn(name):
+    return connection.ops.quote_name(name)
+
+
+def ensure_partition(day):
+    """
+    Creates the partition for `day`, if it isn't there already, returns its name
+    """
+    name = partition_name(day)
+    if name in _created:
+        return name
+    with _created_lock:
+        if name not in _created:
+            create_partition(name, day)
+            _created.add(name)
+    return name
+
+
+def create_partition(name, day):
+    start = datetime.datetime.combine(day, datetime.time())
+    cursor = connection.cursor()
+    cursor.execute('CREATE TABLE IF NOT EXISTS %s (CHECK (%s >= %%s AND %s < %%s)) INHERITS (%s)' % (
+        qn(name), qn('when'), qn('when'), qn(PARENT_TABLE)), [start, start + datetime.timedelta(days=1)])
+    # indexes aren't inherited
+    cursor.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s, %s, %s)' % (
+        qn(name + '_when_path_status'), qn(name), qn('when'), qn('path'), qn('status_code')))
+
+
+def insert(rows, batch_size):
+    """
+    Saves `rows`, dicts of EventLog fields, in their day's partition or ops_eventlog
+    """
+    if not is_partitioned():
+        EventLog.objects.bulk_create([EventLog(**row) for row in rows], batch_size=batch_size)
+        return
+
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(row['when'].date(), []).append(EventLog(**row))
+
+    fields = [f for f in EventLog._meta.concrete_fields if not f.primary_key]
+    cursor = connection.cursor()
+    for day, objs in sorted(by_day.items()):
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (qn(ensure_partition(day)),
+                                                   ', '.join(qn(f.column) for f in fields),
+                                                   ', '.join(['%s'] * len(fields)))
+        cursor.executemany(sql, [[f.get_db_prep_save(f.pre_save(obj, True), connection) for f in fields]
+                                 for obj in objs])
+
+
+def get_partitions():
+    """
+    [(day, table name)] for every partition, oldest first
+    """
+    ret = []
+    for name in connection.introspection.table_names():
+        match = _partition_name.match(name)
+        if match:
+            ret.append((datetime.datetime.strptime(match.group(1), '%Y%m%d').date(), name))
+    return sorted(ret)
+
+
+def drop_before(day):
+    """
+    Removes every row logged before `day`, returns the names of the partitions dropped
+    """
+    dropped = []
+    if connection.vendor != 'postgresql':
+        EventLog.objects.filter(when__lt=datetime.datetime.combine(day, datetime.time())).delete()
+        return dropped
+
+    cursor = connection.cursor()
+    for partition_day, name in get_partitions():
+        if partition_day >= day:
+            break
+        cursor.execute('DROP TABLE IF EXISTS %s' % qn(name))
+        _created.discard(name)
+        dropped.append(name)
+    # rows from before partitioning, uses the (when, path, status_code) index
+    cursor.execute('DELETE FROM ONLY %s WHERE %s < %%s' % (qn(PARENT_TABLE), qn('when')),
+                   [datetime.datetime.combine(day, datetime.time())])
+    return dropped
+
+
+def compact_before(day):
+    """
+    Removes the bodies of successful requests logged before `day`, returns the names of the partitions
+    compacted
+    """
+    compacted = []
+    if connection.vendor != 'postgresql':
+        EventLog.objects.filter(when__lt=datetime.datetime.combine(day, datetime.time()),
+                                status_code__lt='400').update(request_body='', response_body='')
+        return compacted
+
+    for partition_day, name in get_partitions():
+        if partition_day >= day:
+            break
+        if not is_compacted(name):
+            compact_partition(name, partition_day)
+            compacted.append(name)
+    return compacted
+
+
+def is_compacted(name):
+    cursor = connection.cursor()
+    cursor.execute("SELECT obj_description(%s::regclass, 'pg_class')", [qn(name)])
+    return cursor.fetchone()[0] == COMPACTED
+
+
+def compact_partition(name, day):
+    """
+    Rewrites partition `name` without the bodies of successful requests. The rows are copied in to a new
+    table which replaces the old one, rather than UPDATEd in place, so the space is given back at once
+    instead of after a VACUUM FULL.
+    """
+    columns = [f.column for f in EventLog._meta.concrete_fields]
+    selected, params = [], []
+    empty_body = EventLog._meta.get_field('request_body').get_db_prep_save('', connection)
+    for column in columns:
+        if column in ('request_body', 'response_body'):
+            selected.append('CASE WHEN %s < %%s THEN %%s ELSE %s END' % (qn('status_code'), qn(column)))
+            params.extend(['400', empty_body])
+        else:
+            selected.append(qn(column))
+
+    new_name = name + '_compact'
+    with transaction.atomic():
+        create_partition(new_name, day)
+        cursor = connection.cursor()
+        cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s' % (
+            qn(new_name), ', '.join(qn(column) for column in columns), ', '.join(selected), qn(name)), params)
+        cursor.execute('DROP TABLE %s' % qn(name))
+        cursor.execute('ALTER TABLE %s RENAME TO %s' % (qn(new_name), qn(name)))
+        cursor.execute('ALTER INDEX %s RENAME TO %s' % (qn(new_name + '_when_path_status'),
+                                                        qn(name + '_when_path_status')))
+        cursor.execute("COMMENT ON TABLE %s IS '%s'" % (qn(name), COMPACTED))
+
+
+def apply_retention(days=None, compact_days=None):
+    """
+    Drops what's older than `days` and compacts what's older than `compact_days`, both default to the
+    settings. Returns (dropped, compacted) partition names.
+    """
+    if days is None:
+        days = getattr(settings, 'SERVICES_EVENT_LOG_RETENTION_DAYS', 30)
+    if compact_days is None:
+        compact_days = getattr(settings, 'SERVICES_EVENT_LOG_COMPACT_DAYS', None)
+
+    today = datetime.datetime.utcnow().date()
+    dropped = drop_before(today - datetime.timedelta(days=days))
+    compacted = []
+    if compact_days is not None:
+        compacted = compact_before(today - datetime.timedelta(days=compact_days))
+    return dropped, compacted
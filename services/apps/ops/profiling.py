@@ -0,0 +1,285 @@
+"""
+Profiles of the outliers, saved as SlowRequest rows for browsing in the admin
+
+    SERVICES_PROFILE_SLOW_MS    requests taking longer than this are saved, with the functions their
+                                thread was seen in by a stack sampler (None, off)
+    SERVICES_PROFILE_SAMPLE     1 in this many requests is run under cProfile and saved, whatever its
+                                latency (None, off)
+    SERVICES_PROFILE_INTERVAL   seconds between stack samples (0.01)
+    SERVICES_PROFILE_TOP        hot functions kept per request (25)
+    SERVICES_PROFILE_LIMIT      most requests saved a minute by each process (60)
+
+The stack sampler is one thread per process looking at the requests in flight every interval, so a
+request pays for registering itself and nothing else unless it turns out to be slow. cProfile is exact but
+slows the request it's run on down a lot, keep the sample rate low. A controller called from another one's
+method is part of the outer request's profile rather than one of its own. Profiles are saved by a
+background thread, a slow request doesn't wait on its INSERT too.
+"""
+import Queue
+import cProfile
+import json
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from services.apps.ops.background import BackgroundThread, log_error, repeat
+
+SLOW = 'slow'
+SAMPLED = 'sampled'
+
+
+def get_slow_ms():
+    return getattr(settings, 'SERVICES_PROFILE_SLOW_MS', None)
+
+
+def get_sample():
+    return getattr(settings, 'SERVICES_PROFILE_SAMPLE', None)
+
+
+def is_enabled():
+    return get_slow_ms() is not None or bool(get_sample())
+
+
+def function_name(code):
+    return '%s:%d(%s)' % (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+class Capture(object):
+
+    """
+    What's collected about one request: stack samples from the StackSampler, or a cProfile profile
+    """
+
+    def __init__(self, profiler=None):
+        self.started = time.time()
+        self.thread_id = threading.current_thread().ident
+        self.profiler = profiler
+        self.samples = 0
+        self.self_samples = Counter()
+        self.total_samples = Counter()
+
+    def sample(self, frame):
+        self.samples += 1
+        self.self_samples[function_name(frame.f_code)] += 1
+        seen = set()
+        while frame is not None:
+            name = function_name(frame.f_code)
+            # recursion only counts once
+            if name not in seen:
+                seen.add(name)
+                self.total_samples[name] += 1
+            frame = frame.f_back
+
+    def top_functions(self, top, interval):
+        """
+        [{'function', 'calls', 'self_ms', 'total_ms'}] for the `top` functions most time was spent in
+        """
+        if self.profiler is not None:
+            stats = pstats.Stats(self.profiler).stats
+            rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+            return [{'function': '%s:%d(%s)' % func, 'calls': nc, 'self_ms': tt * 1000, 'total_ms': ct * 1000}
+                    for func, (cc, nc, tt, ct, callers) in rows]
+        return [{'function': name, 'calls': None, 'self_ms': count * interval * 1000,
+                 'total_ms': self.total_samples[name] * interval * 1000}
+                for name, count in self.self_samples.most_common(top)]
+
+
+class StackSampler(object):
+
+    """
+    Samples the current frame of every registered request's thread every `interval` seconds
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.captures = {}
+        self.thread = BackgroundThread(self.run, 'StackSampler')
+
+    def add(self, capture):
+        self.thread.ensure()
+        # a controller called from another one's method leaves the sampling to the outer request
+        self.captures.setdefault(capture.thread_id, capture)
+
+    def remove(self, capture):
+        if self.captures.get(capture.thread_id) is capture:
+            del self.captures[capture.thread_id]
+
+    def run(self):
+        repeat(self.interval, self.sample)
+
+    # a default rather than looked up on sys, which is emptied at interpreter shutdown while this may still run
+    def sample(self, current_frames=sys._current_frames):
+        if not self.captures:
+            return
+        frames = current_frames()
+        for thread_id, capture in self.captures.items():
+            frame = frames.get(thread_id)
+            if frame is not None:
+                capture.sample(frame)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = StackSampler(getattr(settings, 'SERVICES_PROFILE_INTERVAL', 0.01))
+    return _sampler
+
+
+class RateLimit(object):
+
+    def __init__(self):
+        self.window = None
+        self.count = 0
+
+    def allow(self, limit):
+        window = int(time.time() // 60)
+        if window != self.window:
+            self.window, self.count = window, 0
+        self.count += 1
+        return self.count <= limit
+
+_saved = RateLimit()
+
+
+class ProfileWriter(object):
+
+    """
+    Saves the SlowRequests queued by finish() every `interval` seconds
+    """
+
+    def __init__(self, interval=1.0, max_queue=100):
+        self.interval = interval
+        self.queue = Queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.thread = BackgroundThread(self.run, 'ProfileWriter')
+
+    def add(self, capture, fields):
+        self.thread.ensure()
+        try:
+            self.queue.put_nowait((capture, fields))
+        except Queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def run(self):
+        repeat(self.interval, self.flush)
+
+    def flush(self):
+        """
+        Saves everything queued, from the calling thread
+        """
+        while True:
+            try:
+                capture, fields = self.queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                save(capture, fields)
+            except Exception as e:
+                log_error("Couldn't save the profile of %s: %s" % (fields['path'], e))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ProfileWriter()
+    return _writer
+
+
+# the capture of the request being profiled on this thread
+_active = threading.local()
+
+
+def start(request):
+    """
+    Starts profiling `request`, returns the Capture to hand finish(), None when it isn't profiled
+    """
+    if getattr(_active, 'capture', None) is not None:
+        # a controller called from another one's method, a second profiler would take over the outer one's
+        return None
+
+    sample = get_sample()
+    if sample and random.randrange(sample) == 0:
+        capture = Capture(profiler=cProfile.Profile())
+        capture.profiler.enable()
+    elif get_slow_ms() is not None:
+        capture = Capture()
+        get_sampler().add(capture)
+    else:
+        capture = None
+    _active.capture = capture
+    return capture
+
+
+def cancel(capture):
+    """
+    Stops profiling without saving anything, for requests that raised
+    """
+    if getattr(_active, 'capture', None) is capture:
+        _active.capture = None
+    if capture.profiler is not None:
+        capture.profiler.disable()
+    else:
+        get_sampler().remove(capture)
+
+
+def finish(capture, request, http_response, endpoint, counter=None, timer=None):
+    """
+    Stops profiling, queues a SlowRequest to be saved if the request was sampled or slow, returns whether it
+    was
+    """
+    duration = time.time() - capture.started
+    cancel(capture)
+    if capture.profiler is not None:
+        reason = SAMPLED
+    else:
+        slow_ms = get_slow_ms()
+        if slow_ms is None or duration * 1000 < slow_ms:
+            return False
+        reason = SLOW
+
+    if not _saved.allow(getattr(settings, 'SERVICES_PROFILE_LIMIT', 60)):
+        return False
+
+    # what's needed of the request and its counters, the capture itself is done with
+    queries = [{'sql': sql, 'ms': seconds * 1000} for sql, seconds in (counter.queries or [])] if counter else []
+    timings = dict((phase, seconds * 1000) for phase, seconds in getattr(timer, 'phases', {}).items())
+    return get_writer().add(capture, {
+        'request_id': request.META.get('HTTP_X_REQUEST_ID') or getattr(request, 'request_id', None) or '',
+        'endpoint': endpoint,
+        'path': request.path[:256],
+        'request_method': request.method,
+        'query_string': request.META.get('QUERY_STRING', '')[:256],
+        'status_code': str(getattr(http_response, 'status_code', '')),
+        'reason': reason,
+        'duration_ms': duration * 1000,
+        'query_count': counter.count if counter else None,
+        'query_ms': counter.time * 1000 if counter else None,
+        'samples': capture.samples if capture.profiler is None else None,
+        'queries': json.dumps(queries),
+        'timings': json.dumps(timings)})
+
+
+def save(capture, fields):
+    from services.apps.ops.models import SlowRequest
+
+    functions = capture.top_functions(getattr(settings, 'SERVICES_PROFILE_TOP', 25), get_sampler().interval)
+    return SlowRequest.objects.create(functions=json.dumps(functions), **fields)
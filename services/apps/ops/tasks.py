@@ -5,6 +5,9 @@ from services.apps.ops.models import EventLog
 
 @task()
 def log_api_interaction(**kwargs):
+    """
+    Saves one EventLog row, event_log.log_api_interaction queues it to be saved in a batch instead
+    """
 
     event = EventLog()
     event.request_id = kwargs.get('request_id')
@@ -1,8 +1,11 @@
 from django.conf.urls import patterns, include, url
-from services.apps.ops.controllers import StatusController, DeployController, HealthController, ErrorReportController
+from services.apps.ops.controllers import StatusController, DeployController, HealthController, ErrorReportController, \
+    LatencyController, MetricsController
 urlpatterns = patterns('',
                        url(r'^status/?$', StatusController()),
                        url(r'^health/?$', HealthController()),
                        url(r'^deploy/?$', DeployController()),
                        url(r'^error/?$', ErrorReportController()),
+                       url(r'^latency/?$', LatencyController()),
+                       url(r'^metrics/?$', MetricsController()),
                        )
@@ -0,0 +1,23 @@
+"""
+Micro benchmarks for the request pipeline.
+Run them from a configured project with: ./manage.py benchmark [suite ...]
+"""
+import timeit
+from importlib import import_module
+
+SUITES = ('dispatch', 'middleware', 'renderers', 'json', 'payload')
+
+
+def bench(func, number=10000, repeat=3):
+    """
+    Returns the best time per call of `func`, in microseconds
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def run_suite(name, number=10000):
+    """
+    Returns a list of (label, microseconds per call) rows for the named suite
+    """
+    module = import_module('services.benchmarks.%s' % name)
+    return module.run(number)
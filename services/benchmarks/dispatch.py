@@ -0,0 +1,50 @@
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+
+from services.benchmarks import bench
+from services.controller import BaseController
+from services.decorators import unauthenticated, render_with
+from services.views import QuerySetView
+
+
+class BenchController(BaseController):
+
+    @unauthenticated
+    @render_with(QuerySetView)
+    def read(self, request, response, title=None, author=None, limit=None):
+        pass
+
+
+def legacy_introspection(controller, request, method):
+    """
+    The per request introspection BaseController.__call__ did before dispatch plans
+    """
+    controller.auth_check(request, method)
+    kwargs = {}
+    controller.has_body_param(method)
+    controller.has_updates_param(method)
+    controller.uses_entity(method)
+    controller.uses_entities(method)
+    controller.set_query_params_to_kwargs(request, method, kwargs)
+    controller.get_view(request, method)
+
+
+def planned_introspection(controller, request):
+    plan = controller.get_dispatch_plan(request)
+    kwargs = {}
+    if plan.uses_query_params:
+        controller.apply_query_params(request, plan, kwargs)
+    plan.view_factory(request)
+
+
+def run(number):
+    controller = BenchController()
+    request = RequestFactory().get('/bench', {'title': 'foo'})
+    request.user = AnonymousUser()
+    method = controller.read
+
+    return [
+        ('dispatch: per request introspection (legacy)', bench(lambda: legacy_introspection(controller, request, method), number)),
+        ('dispatch: per request introspection (plan)', bench(lambda: planned_introspection(controller, request), number)),
+        ('dispatch: full __call__', bench(lambda: controller(request), number)),
+    ]
@@ -0,0 +1,56 @@
+import datetime
+from decimal import Decimal
+
+import simplejson
+
+from services.benchmarks import bench
+from services.json_backends import BACKENDS, load_backend
+from services.utils import DefaultJSONEncoder
+
+
+class LegacyDateTimeAwareJSONEncoder(DefaultJSONEncoder):
+
+    """
+    DateTimeAwareJSONEncoder as it was, rebuilding every datetime and running strftime on it
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            o = datetime.datetime(o.year, o.month, o.day, o.hour, o.minute, o.second, o.microsecond)
+            return o.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+        elif isinstance(o, datetime.date):
+            return o.strftime("%Y-%m-%d")
+        return super(LegacyDateTimeAwareJSONEncoder, self).default(o)
+
+
+def build_payload(rows=500):
+    now = datetime.datetime.utcnow()
+    return {'data': {'results': [{'id': i,
+                                  'title': u'Post number %s' % i,
+                                  'body': u'Lorem ipsum dolor sit amet ' * 5,
+                                  'created_date': now,
+                                  'last_modified': now,
+                                  'published_on': now.date(),
+                                  'price': Decimal('19.99'),
+                                  'author_id': i % 17,
+                                  'tags': ['a', 'b', 'c'],
+                                  'is_public': bool(i % 2)} for i in range(rows)],
+                     'paging': {'page': 1, 'total_count': rows}},
+            'errors': [],
+            'success': True}
+
+
+def run(number):
+    payload = build_payload()
+    number = max(number / 100, 1)
+    rows = [('json: 500 rows, simplejson (legacy encoder)',
+             bench(lambda: simplejson.dumps(payload, cls=LegacyDateTimeAwareJSONEncoder), number))]
+
+    for name in sorted(BACKENDS):
+        try:
+            backend = load_backend(name)
+        except ImportError:
+            continue
+        rows.append(('json: 500 rows, %s' % name, bench(lambda: backend.dumps(payload), number)))
+
+    return rows
@@ -0,0 +1,53 @@
+from importlib import import_module
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+
+from services.benchmarks import bench
+from services.middleware import MiddlewareChain
+from services.views import BaseView
+
+
+class NoopMiddleware(object):
+
+    def process_request(self, request):
+        return None
+
+    def process_response(self, request, response):
+        return response
+
+
+NOOP_MIDDLEWARE = 'services.benchmarks.middleware.NoopMiddleware'
+
+
+def legacy_response_middleware(middleware_classes, request, response):
+    """
+    What BaseController.run_response_middleware did before the chain was cached
+    """
+    for mstring in middleware_classes:
+        module, cls = mstring.rsplit('.', 1)
+        module = import_module(module)
+        cls = getattr(module, cls)
+        response = cls().process_response(request, response)
+    return response
+
+
+def run(number):
+    request = RequestFactory().get('/bench')
+    request.user = AnonymousUser()
+    response = BaseView(request)
+    rows = []
+
+    for count in (0, 3, 10):
+        middleware_classes = [NOOP_MIDDLEWARE] * count
+        chain = MiddlewareChain(middleware_classes)
+
+        def chained():
+            chain.process_request(request)
+            chain.process_response(request, response)
+
+        rows.append(('middleware: %s per response (legacy imports)' % count,
+                     bench(lambda: legacy_response_middleware(middleware_classes, request, response), number)))
+        rows.append(('middleware: %s per request + response (chain)' % count, bench(chained, number)))
+
+    return rows
@@ -0,0 +1,95 @@
+from django.contrib.auth.models import User
+from django.db.models.fields import DateTimeField, DateField
+
+from services.benchmarks import bench
+from services.controller import BaseController
+from services.models import BaseModel
+from services.payload import Payload, DEFAULT_NOT_PROVIDED
+from services.utils import default_time_parse
+
+
+class UserDTO(object):
+    _model = User
+    _ignores = ('password', 'is_superuser', 'is_staff')
+
+
+class SignupDTO(object):
+    username = ''
+    email = ''
+    password = ''
+    remember = False
+    _allowed = ('username', 'email', 'password')
+
+
+def legacy_payload(dto_class, payload):
+    """
+    What Payload.__init__ did for every request before schemas were compiled per class
+    """
+    ret = {}
+    ignored_fields = getattr(dto_class, "_ignores", [])
+    allowed_fields = getattr(dto_class, "_allowed", [])
+    django_model = getattr(dto_class, "_model", None)
+
+    if django_model is not None:
+        model_payload = {}
+        for field in django_model._meta.fields:
+            field_name = field.attname
+            if field.primary_key:
+                continue
+            if field_name in [f.name for f in BaseModel._meta.fields]:
+                continue
+            default = field.default
+            if default == DEFAULT_NOT_PROVIDED or default == '':
+                model_payload[field_name] = ""
+            elif not hasattr(field.default, '__call__'):
+                model_payload[field_name] = field.default
+        ret = {k: v for k, v in payload.iteritems() if k in model_payload.keys()}
+    else:
+        inst = dto_class()
+        provided_fields = [f for f in dto_class.__dict__.keys() if not f.startswith("_") and not
+                           callable(getattr(inst, f, None))]
+        for field in provided_fields:
+            ret[field] = payload.get(field)
+
+    cleaned = {}
+    for key, value in ret.iteritems():
+        if key in ignored_fields:
+            continue
+        if allowed_fields and key not in allowed_fields:
+            continue
+        cleaned[key] = value
+    return cleaned
+
+
+def legacy_updates(model_instance, payload):
+    """
+    What BaseController.update_model_instance_with_payload did before its setters were compiled per model
+    """
+    for field in model_instance._meta.fields:
+        if field.primary_key:
+            continue
+        if field.attname not in payload.keys() and field.name not in payload.keys():
+            continue
+        val = payload.get(field.name, payload.get(field.attname))
+        if field.__class__ in (DateTimeField, DateField):
+            val = default_time_parse(val)
+        setattr(model_instance, field.attname, val)
+
+
+def run(number):
+    controller = BaseController()
+    user = User(id=1, username='user', email='user@example.com')
+    user_payload = {'username': 'new', 'email': 'new@example.com', 'first_name': 'New', 'password': 'x',
+                    'last_login': '2015-01-01 10:00:00', 'unknown': 1}
+    signup_payload = {'username': 'new', 'email': 'new@example.com', 'password': 'x', 'remember': True}
+
+    return [
+        ('payload: @body model dto (legacy)', bench(lambda: legacy_payload(UserDTO, user_payload), number)),
+        ('payload: @body model dto (schema)', bench(lambda: Payload(UserDTO, user_payload), number)),
+        ('payload: @body popo dto (legacy)', bench(lambda: legacy_payload(SignupDTO, signup_payload), number)),
+        ('payload: @body popo dto (schema)', bench(lambda: Payload(SignupDTO, signup_payload), number)),
+        ('payload: @updates (legacy)', bench(lambda: legacy_updates(user, legacy_payload(UserDTO, user_payload)),
+                                            number)),
+        ('payload: @updates (schema)', bench(
+            lambda: controller.update_model_instance_with_payload(user, Payload(UserDTO, user_payload)), number)),
+    ]
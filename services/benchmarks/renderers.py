@@ -0,0 +1,40 @@
+import datetime
+
+from django.contrib.auth.models import User
+
+from services.benchmarks import bench
+from services.views import ModelView, get_renderer
+
+ROWS = 10000
+
+
+class UserView(ModelView):
+    _hides = ('password',)
+
+
+class UserFieldsView(ModelView):
+    _fields = ('id', 'username', 'email', 'date_joined')
+
+
+def run(number):
+    now = datetime.datetime.utcnow()
+    users = [User(id=i, username='user%s' % i, email='user%s@example.com' % i, password='x', date_joined=now)
+             for i in range(ROWS)]
+    number = max(number / 2000, 1)
+    rows = []
+
+    for view_class in (UserView, UserFieldsView):
+        renderer = get_renderer(view_class, User)
+        label = '%s, %s rows' % (view_class.__name__, ROWS)
+        names = renderer.get_names() or [n for n in renderer.columns if n not in renderer.hides]
+        tuples = [tuple(getattr(user, name) for name in names) for user in users]
+
+        rows.append(('renderers: %s, view per row (legacy)' % label,
+                     bench(lambda: [view_class.render_instance(user, None) for user in users], number)))
+        rows.append(('renderers: %s, compiled from instances' % label,
+                     bench(lambda: renderer.render(users, None), number)))
+        # the rows a values_list query would return, built up front: this times the dicts, not the query
+        rows.append(('renderers: %s, dicts from values_list rows (no query)' % label,
+                     bench(lambda: [dict(zip(names, row)) for row in tuples], number)))
+
+    return rows
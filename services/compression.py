@@ -0,0 +1,153 @@
+"""
+gzip and brotli for response bodies, picked from the Accept-Encoding header, see BaseView.serialize
+
+SERVICES_COMPRESSION = False turns it off, bodies shorter than SERVICES_COMPRESSION_MIN_SIZE bytes (1024)
+go out as they are. brotli is offered when the brotli package is installed.
+"""
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from services.utils import KeyCache, parse_accept_header
+
+DEFAULT_MIN_SIZE = 1024
+
+
+class GzipEncoding(object):
+    name = 'gzip'
+    level = 6
+
+    def compressor(self):
+        # 16 + MAX_WBITS writes the gzip header and trailer
+        return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, body):
+        compressor = self.compressor()
+        return compressor.compress(body) + compressor.flush()
+
+    def compress_stream(self, chunks):
+        compressor = self.compressor()
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class BrotliEncoding(object):
+    name = 'br'
+    quality = 5
+
+    def __init__(self):
+        import brotli
+        self.brotli = brotli
+
+    def compress(self, body):
+        return self.brotli.compress(body, quality=self.quality)
+
+    def compress_stream(self, chunks):
+        compressor = self.brotli.Compressor(quality=self.quality)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+_encodings = None
+
+
+def get_encodings():
+    """
+    Every encoding whose library is installed, in the order we prefer them
+    """
+    global _encodings
+    if _encodings is None:
+        encodings = []
+        try:
+            encodings.append(BrotliEncoding())
+        except ImportError:
+            pass
+        encodings.append(GzipEncoding())
+        _encodings = encodings
+    return _encodings
+
+
+def is_enabled():
+    return getattr(settings, 'SERVICES_COMPRESSION', True)
+
+
+def get_min_size():
+    return getattr(settings, 'SERVICES_COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+
+
+def _negotiate(accept_encoding):
+    """
+    The encoding Accept-Encoding gives the highest q, our preference breaks ties. None for identity.
+    """
+    qualities = dict(parse_accept_header(accept_encoding))
+    best, best_quality = None, 0
+    for encoding in get_encodings():
+        quality = qualities.get(encoding.name, qualities.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+# like Accept, there are only a handful of these in the wild
+negotiate = KeyCache(_negotiate, maxsize=1000)
+
+
+def get_encoding(request):
+    if request is None or not is_enabled():
+        return None
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING')
+    if not accept_encoding:
+        return None
+    return negotiate(accept_encoding)
+
+
+def compress_response(request, http_response):
+    """
+    Compresses `http_response` in place when the client takes an encoding we have and the body is big enough
+    """
+    if not is_enabled() or http_response.has_header('Content-Encoding'):
+        return http_response
+
+    if http_response.streaming:
+        patch_vary_headers(http_response, ('Accept-Encoding',))
+        encoding = get_encoding(request)
+        if encoding is not None:
+            http_response.streaming_content = encoding.compress_stream(http_response.streaming_content)
+            http_response['Content-Encoding'] = encoding.name
+        return http_response
+
+    if len(http_response.content) < get_min_size():
+        return http_response
+
+    patch_vary_headers(http_response, ('Accept-Encoding',))
+    encoding = get_encoding(request)
+    if encoding is None:
+        return http_response
+
+    compressed = encoding.compress(http_response.content)
+    if len(compressed) < len(http_response.content):
+        http_response.content = compressed
+        http_response['Content-Encoding'] = encoding.name
+        if http_response.has_header('Content-Length'):
+            http_response['Content-Length'] = str(len(compressed))
+    return http_response
+
+
+def compress_variants(body):
+    """
+    {encoding name: compressed body} for every encoding we have, for keeping next to a cached body
+    """
+    if not is_enabled() or len(body) < get_min_size():
+        return {}
+    ret = {}
+    for encoding in get_encodings():
+        compressed = encoding.compress(body)
+        if len(compressed) < len(body):
+            ret[encoding.name] = compressed
+    return ret
@@ -1,21 +1,50 @@
 
 import logging
 import json
-import inspect
-from importlib import import_module
+import time
 from django.conf import settings
 from django.http import HttpResponse, HttpResponseNotAllowed, QueryDict
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models.fields import DateTimeField, DateField
 
-from services.utils import generic_exception_handler, un_camel_dict, un_camel, default_time_parse
+from services.utils import generic_exception_handler, un_camel_keys, un_camel
 from services.view import BaseView
-from services.payload import Payload
+from services.payload import Payload, get_model_setters
+from services.middleware import middleware_chain
+from services.formats import get_format_for_content_type
+from services.loaders import infer_related
+from services.query_budget import QueryCounter, get_default_budget
+from services import metrics, timing
+from services.dispatch import compile_dispatch_plan, get_query_kwarg_names, get_view_factory
+from services.apps.ops import event_log, profiling
 try:
     from services.apps.ops import tasks as ops_tasks
 except:
     ops_tasks = None  # no celery
 
+# query params the views consume themselves, not handed to **kwargs handlers
+RESERVED_QUERY_PARAMS = ("page_number", "limit", "cursor", "fields")
+
+# (controller class, its view, http verb) -> DispatchPlan, the view being what methods without a
+# @render_with render with, which instances of the same class may set differently
+_dispatch_plans = {}
+
+
+def stream_then(content, counter, callback):
+    """
+    Yields the chunks of a streamed body, counting the queries made for them with `counter`, then calls
+    `callback` once the body has been written out or abandoned
+    """
+    try:
+        if counter is None:
+            for chunk in content:
+                yield chunk
+        else:
+            with counter:
+                for chunk in content:
+                    yield chunk
+    finally:
+        callback()
+
 
 class BaseController(object):
     view = BaseView
@@ -29,78 +58,221 @@ class BaseController(object):
 
     request_logger = logging.getLogger('default')
 
+    # resolved SERVICES_MIDDLEWARE_CLASSES, shared by all controllers
+    middleware = middleware_chain
+
+    def __init__(self):
+        self.compile_dispatch_plans()
+
     def __call__(self, request, *args, **kwargs):
+        started = time.time()
+        timer = timing.start_timer(request) if timing.is_enabled() else None
+        budget = self.get_query_budget(request)
+        with_metrics = metrics.is_enabled()
+        capture = profiling.start(request) if profiling.is_enabled() else None
+
+        if budget is None and capture is None and not (with_metrics and metrics.counts_queries()):
+            counter = None
+        else:
+            counter = QueryCounter(shapes=budget is not None, keep_queries=capture is not None)
+
+        try:
+            if counter is None:
+                http_response = self.dispatch(request, *args, **kwargs)
+            else:
+                with counter:
+                    http_response = self.dispatch(request, *args, **kwargs)
+        except Exception:
+            if capture is not None:
+                profiling.cancel(capture)
+            raise
+
+        if getattr(http_response, 'streaming', False):
+            # the body is rendered as it's written out, the request is accounted for once it has been
+            if timer is not None:
+                http_response['Server-Timing'] = timer.header()
+            http_response.streaming_content = stream_then(
+                http_response.streaming_content, counter,
+                lambda: self.account(request, http_response, started, timer, budget, counter, capture,
+                                     with_metrics))
+            return http_response
+
+        return self.account(request, http_response, started, timer, budget, counter, capture, with_metrics)
+
+    def account(self, request, http_response, started, timer, budget, counter, capture, with_metrics):
+        """
+        Records a request that has been answered in the profiles, query budgets, timings, metrics and the
+        event log, returns the http_response to send
+        """
+        endpoint = self.get_endpoint_name(request)
+        if capture is not None:
+            profiling.finish(capture, request, http_response, endpoint, counter, timer)
+        if budget is not None:
+            http_response = budget.check(endpoint, counter, http_response)
+
+        if timer is not None:
+            timing.record(endpoint, timer.finish())
+            if http_response is not None and not http_response.streaming:
+                http_response['Server-Timing'] = timer.header()
+
+        if with_metrics:
+            # arbitrary request methods would each add their own series to the metric files
+            method = request.method if request.method in self.callmap else 'other'
+            metrics.record_request(endpoint, method, getattr(http_response, 'status_code', 500),
+                                   time.time() - started, counter.count if counter else None)
+
+        if event_log.is_enabled():
+            event_log.log_request(request, http_response)
+        return http_response
+
+    def get_endpoint_name(self, request):
+        if request.method.upper() not in self.callmap:
+            # arbitrary request methods would each get their own histograms
+            return '%s.<other>' % self.__class__.__name__
+        try:
+            plan = self.get_dispatch_plan(request)
+        except NotAllowedException:
+            plan = None
+        return '%s.%s' % (self.__class__.__name__, plan.method_name if plan else request.method)
+
+    def dispatch(self, request, *args, **kwargs):
+        timer = timing.get_timer(request)
+        start = time.time()
 
         request.camel_case = request.META.get(
             "X-SERVICES-CAMEL") is not None or request.GET.get("_camel")
         self.fix_delete_and_put(request)
         self.build_payload(request)
+        start = timer.lap('payload', start)
+
+        short_circuit = self.run_request_middleware(request)
+        start = timer.lap('middleware', start)
+        if short_circuit is not None:
+            return self.finish_response(request, short_circuit)
 
         try:
-            mapped_method = self.get_mapped_method(request)
+            plan = self.get_dispatch_plan(request)
         except NotAllowedException:
             return HttpResponseNotAllowed()
 
-        if not mapped_method:
+        if not plan:
             return HttpResponse("Not Found", status=404)
 
-        auth_result = self.auth_check(request, mapped_method)
+        mapped_method = getattr(self, plan.method_name)
 
-        if auth_result:
-            return auth_result
+        if plan.auth_required:
+            auth_result = self.auth_check(request, mapped_method)
+            start = timer.lap('auth', start)
+            if auth_result:
+                return auth_result
 
         try:
-            if self.has_body_param(mapped_method):
-                body_param = self.build_body_param(request, mapped_method)
-                if body_param:
-                    request.body_param = body_param
-                    args = self.insert_into_arglist(args, body_param)
-
-            if self.has_updates_param(mapped_method):
-                self.build_updates_param(request, mapped_method, kwargs)
-
-            if self.uses_entity(mapped_method):
-                self.set_entity_param(request, mapped_method, kwargs)
-
-            if self.uses_entities(mapped_method):
-                self.set_entities_param(request, mapped_method, kwargs)
+            if plan.builds_params:
+                args = self.build_params(request, plan, mapped_method, args, kwargs)
 
-            kwargs = self.set_query_params_to_kwargs(
-                request, mapped_method, kwargs)
+            if plan.uses_query_params:
+                kwargs = self.apply_query_params(request, plan, kwargs)
 
         except EntityNotFoundException as e:
             return self.view(request).not_found(str(e)).serialize()
 
-        view = self.get_view(request, mapped_method)
+        view = plan.view_factory(request) if plan.view_factory else None
         if view:
             args = self.insert_into_arglist(args, view)
 
         args = self.insert_into_arglist(args, request)
+        start = timer.lap('params', start)
 
         try:
             response = mapped_method(*args, **kwargs)
 
         except Exception, e:
             return self.error_handler(e, request, mapped_method)
+        finally:
+            timer.lap('method', start)
 
         # Allow mapped_method to respond with a view and override ours
         response = response or view
 
+        return self.finish_response(request, response)
+
+    def finish_response(self, request, response):
         # user has replaced baseview with something else (likely HttpResponse
         # or HttpResponseRedirect), we are done
         if not isinstance(response, BaseView):
             return response
 
+        start = time.time()
         response = self.run_response_middleware(request, response)
+        timing.get_timer(request).lap('middleware', start)
+        if not isinstance(response, BaseView):
+            return response
         return response.serialize()
 
+    def get_query_budget(self, request):
+        """
+        The QueryBudget for the method `request` maps to, None when its queries aren't counted
+        """
+        try:
+            plan = self.get_dispatch_plan(request)
+        except NotAllowedException:
+            return None
+        if not plan:
+            return None
+        return plan.query_budget or get_default_budget()
+
+    def get_dispatch_plan(self, request):
+        """
+        Returns the compiled DispatchPlan for this request's method, building it on first use
+        """
+        request_method = request.method.upper()
+        key = (self.__class__, self.view, request_method)
+        try:
+            return _dispatch_plans[key]
+        except KeyError:
+            pass
+
+        method_name = self.callmap.get(request_method)
+        if method_name is None:
+            # not one of our verbs, don't let arbitrary request methods grow the cache
+            return compile_dispatch_plan(self, request.method)
+
+        plan = _dispatch_plans[key] = compile_dispatch_plan(self, method_name)
+        return plan
+
+    def compile_dispatch_plans(self):
+        """
+        Compile the plans for every verb in our callmap up front, controllers are
+        instantiated when the URLconf loads so this keeps introspection off the request path
+        """
+        for request_method, method_name in self.callmap.items():
+            key = (self.__class__, self.view, request_method)
+            if key not in _dispatch_plans:
+                _dispatch_plans[key] = compile_dispatch_plan(self, method_name)
+
+    def build_params(self, request, plan, mapped_method, args, kwargs):
+        if plan.builds_body:
+            body_param = self.build_body_param(request, mapped_method)
+            if body_param:
+                request.body_param = body_param
+                args = self.insert_into_arglist(args, body_param)
+
+        if plan.builds_updates:
+            self.build_updates_param(request, mapped_method, kwargs)
+
+        if plan.builds_entity:
+            self.set_entity_param(request, mapped_method, kwargs)
+
+        if plan.builds_entities:
+            self.set_entities_param(request, mapped_method, kwargs)
+
+        return args
+
+    def run_request_middleware(self, request):
+        return self.middleware.process_request(request)
+
     def run_response_middleware(self, request, response):
-        for mstring in getattr(settings, 'SERVICES_MIDDLEWARE_CLASSES', []):
-            module, cls = mstring.rsplit('.', 1)
-            module = import_module(module)
-            cls = getattr(module, cls)
-            response = cls().process_response(request, response)
-        return response
+        return self.middleware.process_response(request, response)
 
     def error_handler(self, e, request, mapped_method):
         return generic_exception_handler(request, e)
@@ -126,36 +298,24 @@ class BaseController(object):
             request.payload = getattr(
                 request, request.method.upper(), {}).dict()
 
-        if getattr(request, 'camel_case', False) and getattr(request, 'payload', False):
-            request.payload = un_camel_dict(request.payload)
+        else:
+            body_format = get_format_for_content_type(content_type)
+            if body_format is not None:
+                try:
+                    request.payload = body_format.loads(request.body)
+                except Exception as e:
+                    raise Exception('Invalid %s data %s' % (body_format.name, e))
+
+        if getattr(request, 'camel_case', False) and request.payload:
+            request.payload = un_camel_keys(request.payload)
 
     def get_view(self, request, mapped_method):
         # decorators attach the View class to the method itself as '_view',
-        # first look there
-        method_view = getattr(mapped_method, '_view', None)
-
-        # or the controller has a default view property
-        if not method_view:
-            method_view = self.view
-
-        if not method_view:
-            return None
-
-        # the user has given us a class @render_with(QuerySetView)
-        if method_view.__class__ == type and BaseView in inspect.getmro(method_view):
-            view = method_view(request=request)
-
-        # the user has given us an instantiated instance @render_with(QuerySetView(model_view=MyModelView))
-        # we have to reset it and attach the request object to it
-        elif isinstance(method_view, BaseView):
-            view = method_view
-            view.reset(request)
-
-        else:
-            raise Exception(
-                "Invalid view argument %s, must extend BaseView" % method_view)
-
-        return view
+        # first look there, or the controller has a default view property
+        view_factory = get_view_factory(getattr(mapped_method, '_view', None) or self.view)
+        if view_factory:
+            return view_factory(request)
+        return None
 
     def build_body_param(self, request, mapped_method):
 
@@ -191,15 +351,13 @@ class BaseController(object):
 
     def update_model_instance_with_payload(self, model_instance, payload):
         if model_instance and payload:
-            for field in model_instance._meta.fields:
-                if field.primary_key:
+            for name, attname, converter in get_model_setters(model_instance.__class__):
+                if attname not in payload and name not in payload:
                     continue
-                if field.attname not in payload.keys() and field.name not in payload.keys():
-                    continue
-                val = payload.get(field.name, payload.get(field.attname))
-                if field.__class__ in (DateTimeField, DateField):
-                    val = default_time_parse(val)
-                setattr(model_instance, field.attname, val)
+                val = payload.get(name, payload.get(attname))
+                if converter is not None:
+                    val = converter(val)
+                setattr(model_instance, attname, val)
 
     def set_entity_param(self, request, method, kwargs):
         model_class = getattr(method, "_entity_model")
@@ -215,10 +373,21 @@ class BaseController(object):
     def set_entities_param(self, request, method, kwargs):
         queryset = self.get_queryset(
             request, method, "_queryset_model", "_queryset_model_arg", kwargs)
+        queryset = self.infer_entities_related(method, queryset)
         if queryset:
             entity_model_arg = getattr(method, '_queryset_model_arg')
             kwargs[entity_model_arg] = queryset
 
+    def infer_entities_related(self, method, queryset):
+        """
+        select_related / prefetch_related for the relations the method's view renders, before the
+        queryset is first read
+        """
+        model_view = getattr(getattr(method, '_view', None) or self.view, 'model_view', None)
+        if not hasattr(model_view, 'get_related_names'):
+            return queryset
+        return infer_related(queryset, model_view.get_related_names())[0]
+
     def get_model_instance(self, request, method, model_class, model_arg, kwargs):
         """
         model_class -> the django model class
@@ -276,19 +445,21 @@ class BaseController(object):
         return getattr(self, method_name, None)
 
     def set_query_params_to_kwargs(self, request, method, keyword_args):
-        argsppec = inspect.getargspec(method)
-        if not argsppec.defaults and not argsppec.keywords:
-            return keyword_args
+        accepts_any_kwarg, kwarg_names = get_query_kwarg_names(method)
+        return self._set_query_params(request, accepts_any_kwarg, kwarg_names, keyword_args)
+
+    def apply_query_params(self, request, plan, keyword_args):
+        return self._set_query_params(request, plan.accepts_any_kwarg, plan.query_kwarg_names, keyword_args)
 
+    def _set_query_params(self, request, accepts_any_kwarg, kwarg_names, keyword_args):
         # method signature has a **kwargs type argument, give them everything
-        if argsppec.keywords:
+        if accepts_any_kwarg:
             for key in request.GET.keys():
-                if key not in ["page_number", "limit"]:
+                if key not in RESERVED_QUERY_PARAMS:
                     keyword_args[un_camel(key)] = request.GET.get(key)
 
         # just provide the specifically designated keyword args
         else:
-            kwarg_names = argsppec.args[-len(argsppec.defaults):]
             for name in kwarg_names:
                 if request.GET.get(name) is not None:
                     keyword_args[un_camel(name)] = request.GET.get(name)
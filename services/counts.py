@@ -0,0 +1,106 @@
+"""
+Count strategies for paged QuerySetViews, see QuerySetView.count_strategy
+
+The total_count on a paged response is usually the most expensive query in the request,
+these let a view trade exactness for speed.
+"""
+import hashlib
+import logging
+
+from django.core.cache import cache
+from django.db import connections
+try:
+    from django.core.exceptions import EmptyResultSet
+except ImportError:
+    # django < 1.11
+    from django.db.models.sql.datastructures import EmptyResultSet
+
+logger = logging.getLogger('default')
+
+
+class ExactCount(object):
+
+    """
+    SELECT COUNT(*), every time
+    """
+
+    # whether count() is always current, the conditional GET aggregate counts alongside max(last_modified) when it is
+    exact = True
+
+    def count(self, queryset):
+        return queryset.count()
+
+
+class CachedCount(ExactCount):
+
+    """
+    An exact count, kept in the cache for `ttl` seconds per distinct query
+    """
+
+    key_prefix = 'services:count:'
+    exact = False
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+
+    def fingerprint(self, queryset):
+        try:
+            # the params kept apart, str(query) interpolates them ambiguously and can't take non-ascii ones
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return None
+        key = u'%s:%s:%s' % (queryset.db, sql, repr(params))
+        return self.key_prefix + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def count(self, queryset):
+        key = self.fingerprint(queryset)
+        if key is None:
+            return 0
+
+        ret = cache.get(key)
+        if ret is None:
+            ret = queryset.count()
+            cache.set(key, ret, self.ttl)
+        return ret
+
+
+class EstimatedCount(ExactCount):
+
+    """
+    For unfiltered querysets on PostgreSQL, the planner's row estimate for the table (pg_class.reltuples),
+    which is only as fresh as the last ANALYZE. Anything else is counted by `fallback`.
+    """
+
+    exact = False
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or CachedCount()
+
+    def can_estimate(self, queryset):
+        query = queryset.query
+        return (connections[queryset.db].vendor == 'postgresql' and not query.where and not query.distinct and
+                query.low_mark == 0 and query.high_mark is None)
+
+    def estimate(self, queryset):
+        cursor = connections[queryset.db].cursor()
+        try:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+
+        # never analyzed
+        if not row or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+    def count(self, queryset):
+        if self.can_estimate(queryset):
+            try:
+                ret = self.estimate(queryset)
+                if ret is not None:
+                    return ret
+            except Exception as e:
+                logger.error("Count estimate failed for %s: %s" % (queryset.model._meta.db_table, e))
+        return self.fallback.count(queryset)
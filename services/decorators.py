@@ -1,8 +1,11 @@
 from functools import wraps
 from services import utils
 from services.view import BaseView
-from services.lib.decorator import decorator as _decorator
+from services.lib.decorator import decorator as _decorator, decorate as _decorate
+from services.response_cache import ResponseCache
+from services.query_budget import QueryBudget
 import datetime
+import sys
 
 
 @_decorator
@@ -27,6 +30,33 @@ def render_with(view):
     return tag_function('_view', view)
 
 
+def cache_response(ttl=60, vary_on=('query', 'user'), query_params=None, tags=None, name=None):
+    """
+    Cache the serialized response of a GET handler for `ttl` seconds.
+
+    vary_on -> any of 'query' (the query string, or just `query_params` when given) and 'user', leave 'user'
+               out only when every user gets the same response
+    tags -> tags to store the response under, or a callable taking (request, **handler_kwargs) returning them,
+            see response_cache.invalidate_tag and response_cache.model_tag
+    name -> what the cache is reported and keyed as, module.Controller.method by default
+
+    Cached responses skip the SERVICES_MIDDLEWARE_CLASSES response middleware.
+    """
+    def decorator(decorated_function):
+        cache_name = name
+        if cache_name is None:
+            # we're called from the body of the controller class being defined, whose name is its code's
+            owner = sys._getframe(1).f_code.co_name
+            cache_name = '.'.join([decorated_function.__module__] + ([owner] if owner != '<module>' else []) +
+                                  [decorated_function.__name__])
+        response_cache = ResponseCache(decorated_function, ttl=ttl, vary_on=vary_on,
+                                       query_params=query_params, tags=tags, name=cache_name)
+        new_function = _decorate(decorated_function, response_cache)
+        new_function._response_cache = response_cache
+        return new_function
+    return decorator
+
+
 def model_dto(cls):
     return tag_function('_model', cls)
 
@@ -66,6 +96,17 @@ def body(model_class, arg='body'):
     return multitag_function(['_body_param_class', '_body_param_arg'], [model_class, arg])
 
 
+def query_budget(queries, actions=None, repeat_limit=None):
+    """
+    Allow the method `queries` SQL queries per request, see services.query_budget
+
+    actions -> any of 'log', 'header' and 'raise', SERVICES_QUERY_BUDGET_ACTIONS when not given
+    repeat_limit -> times one query shape may repeat before it's reported as an N+1,
+                    SERVICES_QUERY_REPEAT_LIMIT when not given, 0 to allow any
+    """
+    return tag_function('_query_budget', QueryBudget(queries, actions, repeat_limit))
+
+
 def entity(model_class, arg='entity'):
     return multitag_function(['_entity_model', '_entity_model_arg'], [model_class, arg])
 
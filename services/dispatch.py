@@ -0,0 +1,83 @@
+import inspect
+from collections import namedtuple
+
+from services.view import BaseView
+
+
+class DispatchPlan(namedtuple('DispatchPlan', ['method_name', 'builds_body', 'builds_updates', 'builds_entity',
+                                               'builds_entities', 'accepts_any_kwarg', 'query_kwarg_names',
+                                               'view_factory', 'auth_required', 'query_budget'])):
+
+    """
+    Everything BaseController.__call__ needs to know about a mapped method, worked out once per
+    (controller class, view, http verb) instead of re-introspecting the method on every request.
+    """
+
+    __slots__ = ()
+
+    @property
+    def builds_params(self):
+        return self.builds_body or self.builds_updates or self.builds_entity or self.builds_entities
+
+    @property
+    def uses_query_params(self):
+        return self.accepts_any_kwarg or bool(self.query_kwarg_names)
+
+
+def get_query_kwarg_names(method):
+    """
+    Returns (accepts_any_kwarg, names) for the keyword arguments of `method` that may be
+    filled from the query string
+    """
+    argspec = inspect.getargspec(method)
+    if argspec.keywords:
+        return True, ()
+    if not argspec.defaults:
+        return False, ()
+    return False, tuple(argspec.args[-len(argspec.defaults):])
+
+
+def get_view_factory(method_view):
+    """
+    Returns a callable taking the request and returning the view the mapped method should render with
+    """
+    if not method_view:
+        return None
+
+    # the user has given us a class @render_with(QuerySetView)
+    if method_view.__class__ == type and BaseView in inspect.getmro(method_view):
+        return lambda request: method_view(request=request)
+
+    # the user has given us an instantiated instance @render_with(QuerySetView(model_view=MyModelView))
+    # we have to reset it and attach the request object to it
+    if isinstance(method_view, BaseView):
+        def reset_view(request):
+            method_view.reset(request)
+            return method_view
+        return reset_view
+
+    raise Exception("Invalid view argument %s, must extend BaseView" % method_view)
+
+
+def compile_dispatch_plan(controller, method_name):
+    """
+    Build the DispatchPlan for `controller.method_name`, asking the controller's own hooks
+    (has_body_param, uses_entity, ...) so subclasses overriding those are still respected.
+    Returns None if the controller does not implement the method.
+    """
+    method = getattr(controller, method_name, None)
+    if method is None:
+        return None
+
+    accepts_any_kwarg, query_kwarg_names = get_query_kwarg_names(method)
+
+    return DispatchPlan(method_name=method_name,
+                        builds_body=controller.has_body_param(method),
+                        builds_updates=controller.has_updates_param(method),
+                        builds_entity=controller.uses_entity(method),
+                        builds_entities=controller.uses_entities(method),
+                        accepts_any_kwarg=accepts_any_kwarg,
+                        query_kwarg_names=query_kwarg_names,
+                        view_factory=get_view_factory(getattr(method, '_view', None) or controller.view),
+                        auth_required=not hasattr(method, '_unauthenticated'),
+                        query_budget=getattr(method, '_query_budget', None))
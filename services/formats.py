@@ -0,0 +1,150 @@
+"""
+Response and request body formats, picked from the Accept and Content-Type headers.
+
+JSON is always there (and the default), MessagePack and CBOR are offered when the msgpack / cbor2 packages
+are installed. The binary formats carry the same data as the JSON, dates and datetimes included as the
+same strings. Decimals are exact in all of them: CBOR has its own type for them, MessagePack gets them as
+strings.
+"""
+from decimal import Decimal
+
+import simplejson
+
+from services.json_backends import get_json_backend, encode_default
+from services.utils import KeyCache, parse_accept_header
+
+
+class JSONFormat(object):
+    name = 'json'
+    content_type = 'application/json'
+    media_types = ('application/json',)
+    streamable = True
+
+    def dumps(self, obj, indent=None):
+        return get_json_backend().dumps(obj, indent=indent)
+
+    def loads(self, body):
+        return simplejson.loads(body)
+
+
+class MessagePackFormat(object):
+    name = 'msgpack'
+    content_type = 'application/msgpack'
+    media_types = ('application/msgpack', 'application/x-msgpack')
+    streamable = False
+
+    def __init__(self):
+        import msgpack
+        self.msgpack = msgpack
+
+    def dumps(self, obj, indent=None):
+        return self.msgpack.packb(to_primitives(obj), use_bin_type=True)
+
+    def loads(self, body):
+        try:
+            return self.msgpack.unpackb(body, raw=False)
+        except TypeError:
+            # msgpack < 0.5.2
+            return self.msgpack.unpackb(body, encoding='utf-8')
+
+
+class CBORFormat(object):
+    name = 'cbor'
+    content_type = 'application/cbor'
+    media_types = ('application/cbor',)
+    streamable = False
+
+    def __init__(self):
+        import cbor2
+        self.cbor2 = cbor2
+
+    def dumps(self, obj, indent=None):
+        # cbor2 has its own (timezone strict) datetime encoding, give it our strings instead
+        return self.cbor2.dumps(to_primitives(obj, native=(Decimal,)))
+
+    def loads(self, body):
+        return self.cbor2.loads(body)
+
+
+def to_primitives(obj, native=()):
+    """
+    `obj` as the types the binary formats know, with every str made unicode so it's sent as text rather
+    than as a byte string, and everything else turned in to what the JSON would have, except the `native`
+    types the format encodes itself
+    """
+    if isinstance(obj, dict):
+        return {to_text(k): to_primitives(v, native) for k, v in obj.iteritems()}
+    if isinstance(obj, (list, tuple)):
+        return [to_primitives(v, native) for v in obj]
+    if obj is None or isinstance(obj, (unicode, bool, int, long, float)) or isinstance(obj, native):
+        return obj
+    return to_text(obj if isinstance(obj, str) else encode_default(obj))
+
+
+def to_text(value):
+    """
+    str `value` as unicode, left as bytes if it isn't UTF-8
+    """
+    if isinstance(value, str):
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return value
+    return value
+
+
+JSON = JSONFormat()
+
+_formats = None
+
+
+def get_formats():
+    """
+    Every format whose library is installed, JSON first
+    """
+    global _formats
+    if _formats is None:
+        formats = [JSON]
+        for format_class in (MessagePackFormat, CBORFormat):
+            try:
+                formats.append(format_class())
+            except ImportError:
+                pass
+        _formats = formats
+    return _formats
+
+
+def get_format_for_content_type(content_type):
+    media_type = content_type.split(';')[0].strip().lower()
+    for body_format in get_formats():
+        if media_type in body_format.media_types:
+            return body_format
+    return None
+
+
+def _negotiate(accept):
+    """
+    The format the Accept header prefers, JSON if it names nothing we have
+    """
+    choices = [(-quality, position, media_type)
+               for position, (media_type, quality) in enumerate(parse_accept_header(accept)) if quality > 0]
+
+    for _, _, media_type in sorted(choices):
+        if media_type in ('*/*', 'application/*'):
+            return JSON
+        body_format = get_format_for_content_type(media_type)
+        if body_format is not None:
+            return body_format
+    return JSON
+
+# clients send the same few Accept headers over and over
+negotiate = KeyCache(_negotiate, maxsize=1000)
+
+
+def get_response_format(request):
+    if request is None:
+        return JSON
+    accept = request.META.get('HTTP_ACCEPT')
+    if not accept:
+        return JSON
+    return negotiate(accept)
@@ -4,6 +4,8 @@ import simplejson as json
 from collections import defaultdict
 import datetime
 
+from services import metrics
+
 GCM_URL = 'https://android.googleapis.com/gcm/send'
 
 
@@ -41,6 +43,10 @@ class DateTimeAwareJSONEncoder(json.JSONEncoder):
         else:
             return super(DateTimeAwareJSONEncoder, self).default(o)
 
+def count_sent(result, count=1):
+    if count and metrics.is_enabled():
+        metrics.inc('services_push_notifications_total', (('service', 'gcm'), ('result', result)), count)
+
 # TODO: Refactor this to be more human-readable
 def group_response(response, registration_ids, key):
     # Pair up results and reg_ids
@@ -205,8 +211,14 @@ class GCM(object):
             delay_while_idle, time_to_live, False
         )
 
-        response = self.make_request(payload, is_json=False)
-        return self.handle_plaintext_response(response)
+        try:
+            response = self.make_request(payload, is_json=False)
+            ret = self.handle_plaintext_response(response)
+        except GCMException:
+            count_sent('failed')
+            raise
+        count_sent('sent')
+        return ret
 
     def json_request(self, registration_ids, data=None, collapse_key=None,
                         delay_while_idle=False, time_to_live=None):
@@ -229,5 +241,11 @@ class GCM(object):
             delay_while_idle, time_to_live
         )
 
-        response = self.make_request(payload, is_json=True)
+        try:
+            response = self.make_request(payload, is_json=True)
+        except GCMException:
+            count_sent('failed', len(registration_ids))
+            raise
+        count_sent('sent', response.get('success', 0))
+        count_sent('failed', response.get('failure', 0))
         return self.handle_json_response(response, registration_ids)
@@ -0,0 +1,111 @@
+"""
+JSON encoders for BaseView.serialize, picked with the SERVICES_JSON_BACKEND setting:
+
+    'simplejson' (default), simplejson with DateTimeAwareJSONEncoder
+    'json', the standard library's C encoder
+
+or the dotted path of a class with a dumps(obj, indent=None) method.
+All of them write dates as "2012-02-29", datetimes as "2012-02-29T18:22:12.241" (truncated to milliseconds)
+and anything else they don't understand as str(obj). Decimals are written exactly as they are: the
+standard library can only write them as floats, so bodies with Decimals in them go to simplejson.
+"""
+import datetime
+import json
+from decimal import Decimal
+from importlib import import_module
+
+import simplejson
+from django.conf import settings
+from django.test.signals import setting_changed
+
+BACKEND_SETTING = 'SERVICES_JSON_BACKEND'
+
+
+def format_datetime(o):
+    return '%04d-%02d-%02dT%02d:%02d:%02d.%03d' % (o.year, o.month, o.day, o.hour, o.minute, o.second,
+                                                   o.microsecond // 1000)
+
+
+def format_date(o):
+    return '%04d-%02d-%02d' % (o.year, o.month, o.day)
+
+
+def format_time(o):
+    return '%02d:%02d:%02d.%06d' % (o.hour, o.minute, o.second, o.microsecond)
+
+
+def encode_default(o):
+    """
+    The default hook for encoders that don't know our types
+    """
+    if isinstance(o, datetime.datetime):
+        return format_datetime(o)
+    elif isinstance(o, datetime.date):
+        return format_date(o)
+    elif isinstance(o, datetime.time):
+        return format_time(o)
+    elif isinstance(o, Decimal):
+        # as a string, a float would lose digits
+        return str(o)
+    try:
+        return str(o)
+    except Exception:
+        raise TypeError("%r is not JSON serializable" % o)
+
+
+class SimplejsonBackend(object):
+
+    def dumps(self, obj, indent=None):
+        from services.utils import DateTimeAwareJSONEncoder
+        return simplejson.dumps(obj, cls=DateTimeAwareJSONEncoder, indent=indent)
+
+
+class HasDecimal(Exception):
+    pass
+
+
+def stdlib_default(o):
+    if isinstance(o, Decimal):
+        raise HasDecimal()
+    return encode_default(o)
+
+
+class StdlibBackend(object):
+
+    fallback = SimplejsonBackend()
+
+    def dumps(self, obj, indent=None):
+        try:
+            return json.dumps(obj, default=stdlib_default, indent=indent)
+        except HasDecimal:
+            return self.fallback.dumps(obj, indent)
+
+
+BACKENDS = {
+    'simplejson': SimplejsonBackend,
+    'json': StdlibBackend,
+}
+
+_backend = None
+
+
+def load_backend(name):
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    module, cls = name.rsplit('.', 1)
+    return getattr(import_module(module), cls)()
+
+
+def get_json_backend():
+    global _backend
+    if _backend is None:
+        _backend = load_backend(getattr(settings, BACKEND_SETTING, 'simplejson'))
+    return _backend
+
+
+def reset_json_backend(**kwargs):
+    global _backend
+    if kwargs.get('setting') == BACKEND_SETTING:
+        _backend = None
+
+setting_changed.connect(reset_json_backend)
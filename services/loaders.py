@@ -0,0 +1,242 @@
+"""
+Batched loading of the related objects rendered alongside a page of rows
+
+Rendering a foreign key or many to many field row by row is a query per row. The RelatedLoader kept on
+the request collects the ids a whole page of rows points at, fetches them with one IN query per model and
+hands every instance it loads back out for the rest of the request (an identity map), so the same author
+on 50 posts is read once.
+
+When the rows are still an unevaluated queryset, infer_related does better: it works out the
+select_related / prefetch_related lookups for the same relations so they arrive with the rows.
+"""
+from collections import OrderedDict
+
+from django.db.models import ForeignKey, ManyToManyField
+from django.db.models.query import QuerySet
+try:
+    from django.db.models.query import ModelIterable
+except ImportError:
+    # django < 1.9
+    ModelIterable = None
+try:
+    from django.core.exceptions import FieldDoesNotExist
+except ImportError:
+    # django < 1.8
+    from django.db.models.fields import FieldDoesNotExist
+
+
+def _remote_model(field):
+    remote_field = getattr(field, 'remote_field', None) or field.rel
+    return remote_field.model if hasattr(remote_field, 'model') else remote_field.to
+
+
+def _is_cached(field, instance):
+    if hasattr(field, 'is_cached'):
+        return field.is_cached(instance)
+    return hasattr(instance, field.get_cache_name())
+
+
+# (model, names) -> (foreign keys, many to many fields)
+_relations = {}
+# (model, names) -> (select_related paths, prefetch_related paths)
+_relation_paths = {}
+
+
+def get_relation_paths(model, names):
+    """
+    The select_related and prefetch_related lookups covering the relations `names` walk, a name is
+    a field (author) or a dotted path through relations to one (author.name, tags.name)
+    """
+    key = (model, tuple(names))
+    try:
+        return _relation_paths[key]
+    except KeyError:
+        pass
+
+    select, prefetch = [], []
+    for name in names:
+        current, path, many = model, [], False
+        for part in name.split('.'):
+            try:
+                field = current._meta.get_field(part)
+            except FieldDoesNotExist:
+                break
+            # author_id is a column, not the relation
+            if not field.is_relation or part != field.name:
+                break
+            many = many or field.many_to_many or field.one_to_many
+            path.append(part)
+            current = field.related_model
+
+        lookup = '__'.join(path)
+        if not lookup:
+            continue
+        paths = prefetch if many else select
+        if lookup not in paths:
+            paths.append(lookup)
+
+    # select_related('author__publisher') covers select_related('author')
+    select = [p for p in select if not any(o.startswith(p + '__') for o in select)]
+    ret = _relation_paths[key] = (select, prefetch)
+    return ret
+
+
+def infer_related(queryset, names, prefetch=True):
+    """
+    `queryset` with select_related / prefetch_related for the relations `names` walk, along with the lookups
+    added. Querysets that have been evaluated, or don't return instances, are left as they are.
+    """
+    if not isinstance(queryset, QuerySet) or queryset._result_cache is not None or not names:
+        return queryset, [], []
+    if ModelIterable is not None and queryset._iterable_class is not ModelIterable:
+        return queryset, [], []
+
+    select, prefetch_lookups = get_relation_paths(queryset.model, names)
+    if not prefetch:
+        prefetch_lookups = []
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch_lookups:
+        existing = set(lookup if isinstance(lookup, basestring) else lookup.prefetch_to
+                       for lookup in queryset._prefetch_related_lookups)
+        prefetch_lookups = [lookup for lookup in prefetch_lookups if lookup not in existing]
+        if prefetch_lookups:
+            queryset = queryset.prefetch_related(*prefetch_lookups)
+    return queryset, select, prefetch_lookups
+
+
+def queries_saved(rows, select, prefetch):
+    """
+    Roughly how many queries rendering `rows` would have taken without `select` and `prefetch`,
+    a lazy load per row for every relation on the way, less the one query each prefetch still makes
+    """
+    saved = 0
+    for lookup in select:
+        saved += rows * (lookup.count('__') + 1)
+    for lookup in prefetch:
+        hops = lookup.count('__') + 1
+        saved += max(rows * hops - hops, 0)
+    return saved
+
+
+class RelatedLoader(object):
+
+    def __init__(self):
+        # (model, pk) -> instance
+        self.identity_map = {}
+        self.queries = 0
+
+    def get_many(self, model, pks):
+        """
+        {pk: instance} for every pk that exists, only the ones we haven't seen yet are queried
+        """
+        pks = set(pk for pk in pks if pk is not None)
+        missing = [pk for pk in pks if (model, pk) not in self.identity_map]
+        if missing:
+            self.queries += 1
+            for obj in model._default_manager.filter(pk__in=missing):
+                self.identity_map[(model, obj.pk)] = obj
+
+        ret = {}
+        for pk in pks:
+            obj = self.identity_map.get((model, pk))
+            if obj is not None:
+                ret[pk] = obj
+        return ret
+
+    def get(self, model, pk):
+        return self.get_many(model, [pk]).get(pk)
+
+    def get_relations(self, model, names):
+        """
+        The forward foreign keys and many to many fields `names` start from
+        """
+        key = (model, tuple(names))
+        try:
+            return _relations[key]
+        except KeyError:
+            pass
+
+        foreign_keys, many_to_many = [], []
+        # author.name needs the author, the rest of the path is left to the descriptors
+        for name in OrderedDict.fromkeys(name.split('.')[0] for name in names):
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            # a name that is the field's attname (author_id) is rendered from the row itself
+            if name != field.name:
+                continue
+            if isinstance(field, ForeignKey) and field.foreign_related_fields[0].primary_key:
+                foreign_keys.append(field)
+            elif isinstance(field, ManyToManyField):
+                many_to_many.append(field)
+        ret = _relations[key] = (foreign_keys, many_to_many)
+        return ret
+
+    def prime(self, instances, names):
+        """
+        Loads the relations in `names` for every one of `instances`, so rendering them doesn't query
+        """
+        if not instances or not names:
+            return
+        model = type(instances[0])
+        if not hasattr(model, '_meta'):
+            return
+
+        foreign_keys, many_to_many = self.get_relations(model, names)
+        for field in foreign_keys:
+            self.prime_foreign_key(instances, field)
+        for field in many_to_many:
+            self.prime_many_to_many(instances, field)
+
+    def prime_foreign_key(self, instances, field):
+        pending = [obj for obj in instances if getattr(obj, field.attname) is not None and not _is_cached(field, obj)]
+        if not pending:
+            return
+        related = self.get_many(_remote_model(field), [getattr(obj, field.attname) for obj in pending])
+        for obj in pending:
+            value = related.get(getattr(obj, field.attname))
+            # a dangling id, leave it to the descriptor to raise as it would have
+            if value is not None:
+                setattr(obj, field.name, value)
+
+    def prime_many_to_many(self, instances, field):
+        name = field.name
+        pending = [obj for obj in instances if name not in getattr(obj, '_prefetched_objects_cache', {})]
+        if not pending:
+            return
+
+        remote_field = getattr(field, 'remote_field', None) or field.rel
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        self.queries += 1
+        pairs = list(remote_field.through._default_manager.filter(**{source + '__in': [obj.pk for obj in pending]})
+                     .values_list(source, target))
+        related = self.get_many(_remote_model(field), [target_pk for _, target_pk in pairs])
+
+        targets = dict((obj.pk, []) for obj in pending)
+        for source_pk, target_pk in pairs:
+            if target_pk in related:
+                targets[source_pk].append(related[target_pk])
+
+        for obj in pending:
+            # what prefetch_related leaves behind, instance.<name>.all() reads it without a query
+            queryset = getattr(obj, name).get_queryset()
+            queryset._result_cache = targets[obj.pk]
+            queryset._prefetch_done = True
+            if not hasattr(obj, '_prefetched_objects_cache'):
+                obj._prefetched_objects_cache = {}
+            obj._prefetched_objects_cache[name] = queryset
+
+
+def get_loader(request):
+    """
+    The RelatedLoader for `request`, made on first use
+    """
+    if request is None:
+        return RelatedLoader()
+    try:
+        return request._related_loader
+    except AttributeError:
+        loader = request._related_loader = RelatedLoader()
+        return loader
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from services.benchmarks import SUITES, run_suite
+
+
+class Command(BaseCommand):
+    """
+    Runs the services micro benchmarks and prints the time per call of each case
+    Usage: ./manage.py benchmark [suite ...], runs every suite when none are given
+    """
+    args = '[suite ...]'
+    help = 'Benchmark the services request pipeline. Suites: %s' % ', '.join(SUITES)
+
+    def handle(self, *args, **options):
+        for suite in args or SUITES:
+            for label, usec in run_suite(suite):
+                self.stdout.write('%-70s %12.2f us' % (label, usec))
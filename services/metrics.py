@@ -0,0 +1,258 @@
+"""
+Counters and histograms for GET /ops/metrics, in the Prometheus text exposition format
+
+With SERVICES_METRICS_DIR set, every worker process keeps its values in its own mmap'd file in that
+directory and a scrape of any one worker adds up all of the files, so it reports totals for the whole
+server. Clear the directory when the server is (re)started. Without it values are kept in memory and each
+process reports only its own. SERVICES_METRICS = False turns metrics off.
+
+services_db_queries_total is only counted where Django has connection.execute_wrapper (2.0 on). Older
+versions can only count through the debug cursor, which logs every query's SQL, so there it takes
+SERVICES_METRICS_QUERIES = True.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.test.signals import setting_changed
+
+from services.query_budget import can_wrap_queries
+
+# request durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = OrderedDict([
+    ('services_requests_total', ('counter', "Requests served, by endpoint, HTTP method and status code")),
+    ('services_request_duration_seconds', ('histogram', "Time to build the response, by endpoint")),
+    ('services_db_queries_total', ('counter', "SQL queries made while serving requests, by endpoint")),
+    ('services_response_cache_total', ('counter', "@cache_response lookups, by method and result "
+                                                  "(hits, stale_hits, misses)")),
+    ('services_push_notifications_total', ('counter', "Push notifications sent, by service and result")),
+])
+
+
+def is_enabled():
+    return getattr(settings, 'SERVICES_METRICS', True)
+
+
+def counts_queries():
+    count = getattr(settings, 'SERVICES_METRICS_QUERIES', None)
+    return can_wrap_queries() if count is None else count
+
+
+class MemoryStore(object):
+
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def collect(self):
+        return dict(self.values)
+
+
+class MmapStore(object):
+
+    """
+    This process' values in `directory`/metrics_<pid>.db: an 8 byte length of the used part of the
+    file, then entries of a 4 byte key length, the key padded to 8 bytes and an 8 byte double
+    """
+
+    initial_size = 1 << 16
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, 'metrics_%d.db' % os.getpid())
+        self.positions = {}
+        self._lock = threading.Lock()
+
+        self._file = open(self.path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self.initial_size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self.used = struct.unpack_from('q', self._map, 0)[0] or 8
+        for key, value, position in read_entries(self._map, self.used):
+            self.positions[key] = position
+
+    def add_entry(self, key):
+        encoded = key.encode('utf-8')
+        padded = len(encoded) + (8 - (len(encoded) + 4) % 8)
+        size = 4 + padded + 8
+        if self.used + size > len(self._map):
+            new_size = len(self._map) * 2
+            while self.used + size > new_size:
+                new_size *= 2
+            self._map.close()
+            self._file.truncate(new_size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        struct.pack_into('i%dsd' % padded, self._map, self.used, len(encoded), encoded, 0.0)
+        position = self.used + 4 + padded
+        self.used += size
+        # readers stop at the used length, so the entry has to be there before it moves
+        struct.pack_into('q', self._map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def inc(self, key, amount):
+        with self._lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self.add_entry(key)
+            value = struct.unpack_from('d', self._map, position)[0]
+            struct.pack_into('d', self._map, position, value + amount)
+
+    def collect(self):
+        """
+        The sum of every process' values
+        """
+        ret = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < 8:
+                continue
+            for key, value, _ in read_entries(data, struct.unpack_from('q', data, 0)[0]):
+                ret[key] = ret.get(key, 0.0) + value
+        return ret
+
+
+def read_entries(data, used):
+    position = 8
+    while position < used:
+        length = struct.unpack_from('i', data, position)[0]
+        padded = length + (8 - (length + 4) % 8)
+        key = data[position + 4:position + 4 + length].decode('utf-8')
+        value_position = position + 4 + padded
+        yield key, struct.unpack_from('d', data, value_position)[0], value_position
+        position = value_position + 8
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store, _store_pid
+    # a forked worker gets its own file
+    if _store is None or _store_pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store_pid != os.getpid():
+                directory = getattr(settings, 'SERVICES_METRICS_DIR', None)
+                _store = MmapStore(directory) if directory else MemoryStore()
+                _store_pid = os.getpid()
+    return _store
+
+
+def reset_store(**kwargs):
+    global _store
+    if kwargs.get('setting') == 'SERVICES_METRICS_DIR':
+        _store = None
+
+setting_changed.connect(reset_store)
+
+# (name, labels) -> store key
+_keys = {}
+
+
+def get_key(name, labels):
+    key = (name, labels)
+    try:
+        return _keys[key]
+    except KeyError:
+        encoded = _keys[key] = json.dumps([name, labels])
+        return encoded
+
+
+def inc(name, labels=(), amount=1):
+    """
+    Adds `amount` to the counter `name` with `labels`, a tuple of (label, value) pairs
+    """
+    get_store().inc(get_key(name, labels), amount)
+
+
+def observe(name, value, labels=()):
+    """
+    Records `value` in the histogram `name`, in DURATION_BUCKETS
+    """
+    store = get_store()
+    for bound in DURATION_BUCKETS:
+        if value <= bound:
+            break
+    else:
+        bound = '+Inf'
+    store.inc(get_key(name + '_bucket', labels + (('le', str(bound)),)), 1)
+    store.inc(get_key(name + '_sum', labels), value)
+    store.inc(get_key(name + '_count', labels), 1)
+
+
+def record_request(endpoint, method, status, duration, queries=None):
+    labels = (('endpoint', endpoint),)
+    inc('services_requests_total', labels + (('method', method), ('status', str(status))))
+    observe('services_request_duration_seconds', duration, labels)
+    if queries is not None:
+        inc('services_db_queries_total', labels, queries)
+
+
+def escape_label(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, escape_label(value)) for name, value in labels)
+
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else '%d' % value
+
+
+def exposition():
+    """
+    Everything collected, as Prometheus text
+    """
+    samples = {}
+    for key, value in get_store().collect().items():
+        name, labels = json.loads(key)
+        samples[(name, tuple(tuple(label) for label in labels))] = value
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        if metric_type == 'histogram':
+            series = histogram_series(name, samples)
+        else:
+            series = sorted((labels, value) for (sample, labels), value in samples.items() if sample == name)
+            series = [(name, labels, value) for labels, value in series]
+        if not series:
+            continue
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, metric_type))
+        for sample, labels, value in series:
+            lines.append('%s%s %s' % (sample, format_labels(labels), format_value(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def histogram_series(name, samples):
+    """
+    The _bucket (cumulative, as Prometheus wants them), _sum and _count samples of histogram `name`
+    """
+    ret = []
+    label_sets = sorted(labels for sample, labels in samples if sample == name + '_count')
+    for labels in label_sets:
+        cumulative = 0
+        for bound in [str(b) for b in DURATION_BUCKETS] + ['+Inf']:
+            cumulative += samples.get((name + '_bucket', labels + (('le', bound),)), 0)
+            ret.append((name + '_bucket', labels + (('le', bound),), cumulative))
+        ret.append((name + '_sum', labels, samples[(name + '_sum', labels)]))
+        ret.append((name + '_count', labels, samples[(name + '_count', labels)]))
+    return ret
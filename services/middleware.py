@@ -0,0 +1,88 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test.signals import setting_changed
+
+MIDDLEWARE_SETTING = 'SERVICES_MIDDLEWARE_CLASSES'
+
+
+def load_middleware_class(path):
+    module, cls = path.rsplit('.', 1)
+    return getattr(import_module(module), cls)
+
+
+class MiddlewareChain(object):
+
+    """
+    The SERVICES_MIDDLEWARE_CLASSES, imported and instantiated once and reused for every request.
+
+    Middleware may define process_request(request) and/or process_response(request, response),
+    both run in the order they are listed.
+    process_request returning anything but None short circuits the request: the mapped method
+    is never called and what was returned becomes the response.
+    process_response returning something other than a BaseView (an HttpResponse say) short
+    circuits the remaining response middleware.
+    """
+
+    def __init__(self, middleware_classes=None):
+        # explicit classes pin the chain, otherwise we follow settings
+        self.middleware_classes = middleware_classes
+        self.request_middleware = None
+        self.response_middleware = None
+
+    def load(self):
+        middleware_classes = self.middleware_classes
+        if middleware_classes is None:
+            middleware_classes = getattr(settings, MIDDLEWARE_SETTING, [])
+
+        request_middleware = []
+        response_middleware = []
+        for middleware_class in middleware_classes:
+            if isinstance(middleware_class, basestring):
+                middleware_class = load_middleware_class(middleware_class)
+            middleware = middleware_class()
+            if hasattr(middleware, 'process_request'):
+                request_middleware.append(middleware.process_request)
+            if hasattr(middleware, 'process_response'):
+                response_middleware.append(middleware.process_response)
+
+        self.response_middleware = tuple(response_middleware)
+        self.request_middleware = tuple(request_middleware)
+
+    def reset(self):
+        """
+        Forget the resolved middleware, they'll be re-imported on the next request
+        """
+        self.request_middleware = None
+        self.response_middleware = None
+
+    def process_request(self, request):
+        if self.request_middleware is None:
+            self.load()
+
+        for process_request in self.request_middleware:
+            response = process_request(request)
+            if response is not None:
+                return response
+        return None
+
+    def process_response(self, request, response):
+        if self.response_middleware is None:
+            self.load()
+
+        for process_response in self.response_middleware:
+            response = process_response(request, response)
+            if isinstance(response, HttpResponse):
+                break
+        return response
+
+
+middleware_chain = MiddlewareChain()
+
+
+def reset_middleware_chain(**kwargs):
+    if kwargs.get('setting') == MIDDLEWARE_SETTING:
+        middleware_chain.reset()
+
+setting_changed.connect(reset_middleware_chain)
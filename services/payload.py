@@ -1,12 +1,17 @@
 import simplejson as json
-from django.db.models.fields import NOT_PROVIDED as DEFAULT_NOT_PROVIDED
+from django.db.models.fields import NOT_PROVIDED as DEFAULT_NOT_PROVIDED, DateTimeField, DateField
 from services.models import BaseModel
+from services.utils import default_time_parse
 
 
-class Payload(dict):
+class PayloadSchema(object):
 
-    def __init__(self, dto_class, payload=None):
-        ret = {}
+    """
+    Everything Payload needs to know about a dto class, worked out once per class instead of for every
+    request, see get_schema
+    """
+
+    def __init__(self, dto_class):
         self.dto_class = dto_class
 
         # blacklist for input fields
@@ -17,41 +22,103 @@ class Payload(dict):
 
         self.django_model = getattr(dto_class, "_model", None)
 
-        self.payload = {}
-
-        # The dto class refers to a django object, build the base payload
-        # for that class given the provided payload
         if self.django_model is not None:
-            ret = self.get_allowed_model_payload(payload)
+            # the dto class refers to a django object, its fields and their defaults make the payload
+            self.defaults = model_defaults(self.django_model)
         else:
-            # just a `popo` dto, look at the proprties
-            # and try and build a payload based on that
+            # just a `popo` dto, its properties and their values make the payload
             inst = dto_class()
-            provided_fields = [f for f in dto_class.__dict__.keys() if not f.startswith("_") and not
-                               callable(getattr(inst, f, None))]
-
-            # no properties on the DTO class, must be arbitrary object DTO
-            if not provided_fields:
-                ret = payload or {}
-            else:
-                # loop over the fields
-                for field in provided_fields:
-                    if payload is not None:
-                        # use provided payload to populate
-                        ret[field] = payload.get(field)
-                    else:
-                        # use default defined in DTO definition
-                        ret[field] = getattr(inst, field, "")
-
-        # finally, apply our ignored and allowed fields filters
-        for key, value in ret.iteritems():
-            if key in self.ignored_fields:
-                continue
-            if self.allowed_fields and key not in self.allowed_fields:
-                continue
-            self.payload[key] = value
-
-        super(Payload, self).__init__(**self.payload)
+            self.defaults = dict((f, getattr(inst, f, "")) for f in dto_class.__dict__.keys()
+                                 if not f.startswith("_") and not callable(getattr(inst, f, None)))
+
+        # no properties on the DTO class, must be arbitrary object DTO
+        self.arbitrary = self.django_model is None and not self.defaults
+
+        # the fields left once our ignored and allowed fields filters are applied
+        self.fields = frozenset(f for f in self.defaults if self.accepts(f))
+
+    def accepts(self, key):
+        if key in self.ignored_fields:
+            return False
+        return not self.allowed_fields or key in self.allowed_fields
+
+    def build(self, payload=None):
+        """
+        The filtered payload dict for `payload`, the defaults when it's None
+        """
+        if self.arbitrary:
+            return {k: v for k, v in (payload or {}).iteritems() if self.accepts(k)}
+        if payload is None:
+            return {f: self.defaults[f] for f in self.fields}
+        if self.django_model is not None:
+            # only what was sent
+            fields = self.fields
+            return {k: v for k, v in payload.iteritems() if k in fields}
+        return {f: payload.get(f) for f in self.fields}
+
+
+_schemas = {}
+
+
+def get_schema(dto_class):
+    try:
+        return _schemas[dto_class]
+    except KeyError:
+        schema = _schemas[dto_class] = PayloadSchema(dto_class)
+        return schema
+
+
+def model_defaults(model):
+    """
+    {attname: default} for the fields of `model` a payload may set, "" where there's no plain default
+    """
+    ret = {}
+    base_names = [f.name for f in BaseModel._meta.fields]
+
+    for field in model._meta.fields:
+        field_name = field.attname
+        if field.primary_key:
+            continue
+        if field_name in base_names:
+            continue
+        default = field.default
+        if default == DEFAULT_NOT_PROVIDED or default == '':
+            ret[field_name] = ""
+
+        elif not hasattr(field.default, '__call__'):
+            ret[field_name] = field.default
+
+    return ret
+
+
+_setters = {}
+
+
+def get_model_setters(model):
+    """
+    [(name, attname, converter)] for the fields of `model` an update payload may set, converter being None
+    where the payload's value is used as it is
+    """
+    try:
+        return _setters[model]
+    except KeyError:
+        setters = _setters[model] = [
+            (field.name, field.attname, default_time_parse if field.__class__ in (DateTimeField, DateField) else None)
+            for field in model._meta.fields if not field.primary_key]
+        return setters
+
+
+class Payload(dict):
+
+    def __init__(self, dto_class, payload=None):
+        schema = get_schema(dto_class)
+        self.dto_class = dto_class
+        self.ignored_fields = schema.ignored_fields
+        self.allowed_fields = schema.allowed_fields
+        self.django_model = schema.django_model
+        self.payload = schema.build(payload)
+
+        super(Payload, self).__init__(self.payload)
 
     def to_obj(self):
         if self.django_model:
@@ -79,7 +146,7 @@ class Payload(dict):
         ret = self.create_test_model_payload()
 
         if payload is not None:
-            return {k: v for k, v in payload.iteritems() if k in ret.keys()}
+            return {k: v for k, v in payload.iteritems() if k in ret}
 
         return ret
 
@@ -99,19 +166,4 @@ class Payload(dict):
         Use our django mmodel to construct a test payload, looking at the default values
         for the fields where we can
         """
-        ret = {}
-
-        for field in self.django_model._meta.fields:
-            field_name = field.attname
-            if field.primary_key:
-                continue
-            if field_name in [f.name for f in BaseModel._meta.fields]:
-                continue
-            default = field.default
-            if default == DEFAULT_NOT_PROVIDED or default == '':
-                ret[field_name] = ""
-
-            elif not hasattr(field.default, '__call__'):
-                ret[field_name] = field.default
-
-        return ret
+        return dict(get_schema(self.dto_class).defaults)
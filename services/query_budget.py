@@ -0,0 +1,163 @@
+"""
+Per request SQL query counting for controller methods, see decorators.query_budget
+
+A method's budget comes from @query_budget(n), or the SERVICES_QUERY_BUDGET setting for every method
+without one. Requests to methods with a budget are counted (queries, time spent in the database, and how
+often each query shape repeats); going over it, or repeating one shape SERVICES_QUERY_REPEAT_LIMIT times
+(an N+1, 10 by default), is reported by each of SERVICES_QUERY_BUDGET_ACTIONS:
+
+    'log'     a warning in the 'default' logger (the default)
+    'header'  an X-Query-Budget header on the response
+    'raise'   QueryBudgetExceeded, for test settings
+
+A streamed response is checked once its body has been written out, too late for the 'header' action.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('default')
+
+DEFAULT_REPEAT_LIMIT = 10
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_shape(sql):
+    """
+    `sql` with its literals and IN lists collapsed, so one query made for every row looks the same each time
+    """
+    return _in_lists.sub('(...)', _literals.sub('?', sql))
+
+
+def can_wrap_queries():
+    """
+    Whether QueryCounter can count through connection.execute_wrapper, rather than the debug cursor
+    """
+    return hasattr(connections[DEFAULT_DB_ALIAS], 'execute_wrapper')
+
+
+class QueryCounter(object):
+
+    """
+    Counts the queries made on every connection while it's entered, through connection.execute_wrapper
+    where Django has it, by reading the debug cursor's log where it doesn't
+    """
+
+    # most queries kept for keep_queries
+    max_queries = 200
+
+    def __init__(self, shapes=True, keep_queries=False):
+        self.count = 0
+        self.time = 0.0
+        # whether to tally query shapes, just counting is a lot cheaper
+        self.count_shapes = shapes
+        self.shapes = Counter()
+        # [(shape, seconds)] in the order they were made, when keep_queries
+        self.queries = [] if keep_queries else None
+        self._wrappers = []
+        self._logged = []
+
+    def __enter__(self):
+        for connection in connections.all():
+            if hasattr(connection, 'execute_wrapper'):
+                wrapper = connection.execute_wrapper(self)
+                wrapper.__enter__()
+                self._wrappers.append(wrapper)
+            else:
+                self._logged.append((connection, connection.force_debug_cursor, len(connection.queries_log)))
+                connection.force_debug_cursor = True
+        return self
+
+    def __exit__(self, *exc_info):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(*exc_info)
+        for connection, force_debug_cursor, start in self._logged:
+            connection.force_debug_cursor = force_debug_cursor
+            for query in islice(connection.queries_log, start, None):
+                self.record(query['sql'], float(query['time']))
+        self._wrappers, self._logged = [], []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.time() - start)
+
+    def record(self, sql, duration):
+        self.count += 1
+        self.time += duration
+        if self.count_shapes:
+            self.shapes[query_shape(sql)] += 1
+        if self.queries is not None and len(self.queries) < self.max_queries:
+            self.queries.append((query_shape(sql), duration))
+
+    def repeated(self, limit):
+        """
+        [(shape, times)] for the query shapes made at least `limit` times, most repeated first
+        """
+        return [(shape, times) for shape, times in self.shapes.most_common() if times >= limit]
+
+
+class QueryBudget(object):
+
+    def __init__(self, queries, actions=None, repeat_limit=None):
+        self.queries = queries
+        self._actions = actions
+        self._repeat_limit = repeat_limit
+
+    @property
+    def actions(self):
+        actions = self._actions or getattr(settings, 'SERVICES_QUERY_BUDGET_ACTIONS', ('log',))
+        return (actions,) if isinstance(actions, basestring) else actions
+
+    @property
+    def repeat_limit(self):
+        if self._repeat_limit is not None:
+            return self._repeat_limit
+        return getattr(settings, 'SERVICES_QUERY_REPEAT_LIMIT', DEFAULT_REPEAT_LIMIT)
+
+    def check(self, name, counter, http_response):
+        """
+        Reports `counter` going over budget for the method `name`, returns the http_response to send
+        """
+        repeated = self.repeated(counter)
+        if counter.count <= self.queries and not repeated:
+            return http_response
+
+        message = "%s made %d queries (budget %d) in %.1fms" % (name, counter.count, self.queries,
+                                                                 counter.time * 1000)
+        if repeated:
+            message += ", repeated: " + "; ".join('%dx %s' % (times, shape) for shape, times in repeated)
+
+        actions = self.actions
+        if 'raise' in actions:
+            raise QueryBudgetExceeded(message)
+        if 'log' in actions:
+            logger.warning(message)
+        if 'header' in actions and http_response is not None:
+            http_response['X-Query-Budget'] = 'queries=%d; budget=%d; time=%.1fms; repeated=%d' % (
+                counter.count, self.queries, counter.time * 1000, len(repeated))
+        return http_response
+
+    def repeated(self, counter):
+        limit = self.repeat_limit
+        return counter.repeated(limit) if limit else []
+
+
+def get_default_budget():
+    queries = getattr(settings, 'SERVICES_QUERY_BUDGET', None)
+    if queries is None:
+        return None
+    return QueryBudget(queries)
@@ -0,0 +1,216 @@
+import hashlib
+import inspect
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+from services import metrics
+from services.compression import compress_variants, get_encoding
+from services.formats import get_response_format
+from services.view import BaseView
+
+KEY_PREFIX = 'services:response:'
+TAG_PREFIX = 'services:tag:'
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Vary')
+
+# every ResponseCache made by @cache_response, for reporting
+response_caches = []
+
+
+def model_tag(model, pk=None):
+    """
+    The invalidation tag for a model class, or a single row of it when given an instance or pk
+    """
+    if pk is None and getattr(model, 'pk', None) is not None and not isinstance(model, type):
+        pk = model.pk
+    model_class = model if isinstance(model, type) else model.__class__
+    tag = model_class._meta.db_table
+    if pk is not None:
+        tag = '%s:%s' % (tag, pk)
+    return tag
+
+
+def invalidate_tag(*tags):
+    """
+    Expire every cached response stored under any of `tags`
+    """
+    cache.set_many(dict((TAG_PREFIX + tag, uuid.uuid4().hex) for tag in tags), None)
+
+
+def get_tag_versions(tags, create=False):
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    if create:
+        for key in keys:
+            if key not in versions:
+                version = uuid.uuid4().hex
+                # another worker may beat us to it, theirs wins
+                if not cache.add(key, version, None):
+                    version = cache.get(key, version)
+                versions[key] = version
+    return versions
+
+
+def cache_stats():
+    """
+    Hit and miss counts for every cached method, plus totals
+    """
+    ret = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'methods': {}}
+    for response_cache in response_caches:
+        counts = response_cache.counts()
+        ret['methods'][response_cache.name] = counts
+        for name in ('hits', 'misses', 'stale_hits'):
+            ret[name] += counts[name]
+    return ret
+
+
+class ResponseCache(object):
+
+    """
+    Caches the body BaseView.serialize produces for a controller method, see decorators.cache_response
+
+    Entries are kept for ttl + grace seconds, past ttl they are stale: the first worker to notice takes
+    a lock and recomputes while everyone else keeps serving the stale body.
+    """
+
+    lock_timeout = 10
+    cold_wait = 0.05
+
+    def __init__(self, func, ttl=60, vary_on=('query', 'user'), query_params=None, tags=None, grace=None, name=None):
+        self.name = name or '%s.%s' % (func.__module__, func.__name__)
+        self.ttl = ttl
+        self.grace = ttl if grace is None else grace
+        self.vary_on = vary_on
+        self.query_params = query_params
+        self.tags = tags
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._lock = threading.Lock()
+        response_caches.append(self)
+
+    def counts(self):
+        return {'hits': self.hits, 'misses': self.misses, 'stale_hits': self.stale_hits}
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        if metrics.is_enabled():
+            metrics.inc('services_response_cache_total', (('method', self.name), ('result', name)))
+
+    def build_key(self, request):
+        parts = [self.name, request.path, getattr(request, 'camel_case', False), get_response_format(request).name]
+        if 'query' in self.vary_on:
+            names = self.query_params if self.query_params is not None else sorted(request.GET.keys())
+            parts.extend('%s=%s' % (name, request.GET.getlist(name)) for name in names)
+        if 'user' in self.vary_on:
+            user = getattr(request, 'user', None)
+            parts.append(user.pk if user is not None and user.is_authenticated() else 'anonymous')
+        return KEY_PREFIX + hashlib.md5(':'.join(str(part) for part in parts)).hexdigest()
+
+    def get_tags(self, func, request, args, kwargs):
+        if callable(self.tags):
+            # hand the callable the handler's arguments by name, url kwargs arrive positionally
+            handler_kwargs = inspect.getcallargs(func, *args, **kwargs)
+            handler_kwargs.pop('self', None)
+            handler_kwargs.pop('request', None)
+            return list(self.tags(request, **handler_kwargs))
+        return list(self.tags or [])
+
+    def is_current(self, entry, tags):
+        if not entry['tags']:
+            return True
+        return get_tag_versions(tags) == entry['tags']
+
+    def __call__(self, func, *args, **kwargs):
+        request = [a for a in args if hasattr(a, 'GET')][0]
+        if request.method not in ('GET', 'HEAD'):
+            return func(*args, **kwargs)
+
+        key = self.build_key(request)
+        tags = self.get_tags(func, request, args, kwargs)
+        entry = cache.get(key)
+        if entry is not None and not self.is_current(entry, tags):
+            entry = None
+
+        if entry is not None:
+            if entry['expires'] > time.time() or not cache.add(key + ':lock', 1, self.lock_timeout):
+                self.count('hits' if entry['expires'] > time.time() else 'stale_hits')
+                return self.to_http_response(request, entry)
+            locked = True
+        else:
+            # nothing to serve stale, wait out whoever is computing it before doing it ourselves
+            deadline = time.time() + self.lock_timeout
+            locked = cache.add(key + ':lock', 1, self.lock_timeout)
+            while not locked and time.time() < deadline:
+                time.sleep(self.cold_wait)
+                entry = cache.get(key)
+                if entry is not None and self.is_current(entry, tags):
+                    self.count('hits')
+                    return self.to_http_response(request, entry)
+                locked = cache.add(key + ':lock', 1, self.lock_timeout)
+
+        self.count('misses')
+        try:
+            return self.compute(func, key, tags, request, args, kwargs)
+        finally:
+            # past the deadline we compute without having taken the lock, it's whoever holds it that releases it
+            if locked:
+                cache.delete(key + ':lock')
+
+    def compute(self, func, key, tags, request, args, kwargs):
+        response = func(*args, **kwargs)
+        if response is None:
+            response = get_view_arg(args)
+
+        # an HttpResponse or nothing we know how to serialize, pass it along uncached
+        if not isinstance(response, BaseView):
+            return response
+
+        # compressed below, once per encoding, rather than for whoever happened to miss
+        response.compress = False
+        http_response = response.serialize()
+        # streamed bodies are too big to be worth caching
+        if http_response.status_code != 200 or http_response.streaming:
+            return http_response
+
+        body = http_response.content
+        entry = {'body': body,
+                 'encoded': compress_variants(body),
+                 'content_type': http_response['Content-Type'],
+                 'headers': dict((h, http_response[h]) for h in CACHED_HEADERS if http_response.has_header(h)),
+                 'expires': time.time() + self.ttl,
+                 'tags': get_tag_versions(tags, create=True) if tags else {}}
+        cache.set(key, entry, self.ttl + self.grace)
+        return self.to_http_response(request, entry, http_response)
+
+    def to_http_response(self, request, entry, http_response=None):
+        etag = entry['headers'].get('ETag')
+        encoded = entry.get('encoded')
+        if http_response is None and etag and etag in [e.strip() for e in
+                                                       request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            http_response = HttpResponseNotModified()
+        else:
+            if http_response is None:
+                http_response = HttpResponse(entry['body'], content_type=entry['content_type'])
+            encoding = get_encoding(request) if encoded else None
+            if encoding is not None and encoding.name in encoded:
+                http_response.uncompressed_content = entry['body']
+                http_response.content = encoded[encoding.name]
+                http_response['Content-Encoding'] = encoding.name
+        for header, value in entry['headers'].items():
+            http_response[header] = value
+        if encoded:
+            patch_vary_headers(http_response, ('Accept-Encoding',))
+        return http_response
+
+
+def get_view_arg(args):
+    for arg in args:
+        if isinstance(arg, BaseView):
+            return arg
+    return None
@@ -0,0 +1,161 @@
+"""
+Timing for the phases of BaseController's dispatch, sent back as a Server-Timing header and kept as
+per endpoint latency histograms in this process, see latency_stats and GET /ops/latency
+
+Phases are payload, middleware, auth, params (entities, updates, query params), method, render, encode
+and total. SERVICES_TIMING = False turns all of it off.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+# values below 2 ** SUB_BUCKET_BITS microseconds are counted exactly, above that each power of 2 is split
+# in 2 ** (SUB_BUCKET_BITS - 1) buckets, about 1.5% apart
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+
+# (endpoint, phase) -> LatencyHistogram
+histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'SERVICES_TIMING', True)
+
+
+class RequestTimer(object):
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases = OrderedDict()
+
+    def lap(self, phase, start):
+        """
+        Adds the time since `start` to `phase`, returns now for timing the next one
+        """
+        now = time.time()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - start
+        return now
+
+    def finish(self):
+        self.phases['total'] = time.time() - self.started
+        return self.phases
+
+    def header(self):
+        return ', '.join('%s;dur=%.2f' % (phase, seconds * 1000) for phase, seconds in self.phases.items())
+
+
+class NullTimer(object):
+
+    """
+    What get_timer hands out when timing is off
+    """
+
+    def lap(self, phase, start):
+        return start
+
+_null_timer = NullTimer()
+
+
+def start_timer(request):
+    timer = request._timer = RequestTimer()
+    return timer
+
+
+def get_timer(request):
+    return getattr(request, '_timer', None) or _null_timer
+
+
+class LatencyHistogram(object):
+
+    """
+    Counts of microsecond latencies in log-linear buckets, in the manner of HdrHistogram
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket(value):
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + ((value >> shift) - HALF_SUB_BUCKETS)
+
+    @staticmethod
+    def bucket_range(index):
+        """
+        The (lowest, highest) values counted in bucket `index`
+        """
+        if index < SUB_BUCKETS:
+            return index, index
+        shift = (index - SUB_BUCKETS) // HALF_SUB_BUCKETS + 1
+        lowest = (HALF_SUB_BUCKETS + (index - SUB_BUCKETS) % HALF_SUB_BUCKETS) << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def record(self, seconds):
+        value = int(seconds * 1000000)
+        index = self.bucket(value)
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.total += 1
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, percent):
+        """
+        The latency in microseconds `percent` of the recorded values are at or below, None when empty
+        """
+        with self._lock:
+            counts = sorted(self.counts.items())
+            total = self.total
+        if not total:
+            return None
+
+        needed = max(1, int(round(total * percent / 100.0)))
+        seen = 0
+        for index, count in counts:
+            seen += count
+            if seen >= needed:
+                lowest, highest = self.bucket_range(index)
+                return (lowest + highest) // 2
+        return self.max
+
+
+def get_histogram(endpoint, phase):
+    key = (endpoint, phase)
+    try:
+        return histograms[key]
+    except KeyError:
+        with _histograms_lock:
+            return histograms.setdefault(key, LatencyHistogram())
+
+
+def record(endpoint, phases):
+    for phase, seconds in phases.items():
+        get_histogram(endpoint, phase).record(seconds)
+
+
+def latency_stats(percentiles=(50, 95, 99)):
+    """
+    {endpoint: {phase: {'count', 'max', 'p50', ...}}} in milliseconds, for everything recorded so far
+    """
+    ret = {}
+    for (endpoint, phase), histogram in sorted(histograms.items()):
+        stats = {'count': histogram.total, 'max': histogram.max / 1000.0}
+        for percent in percentiles:
+            value = histogram.percentile(percent)
+            stats['p%s' % percent] = value / 1000.0 if value is not None else None
+        ret.setdefault(endpoint, OrderedDict())[phase] = stats
+    return ret
+
+
+def reset():
+    with _histograms_lock:
+        histograms.clear()
@@ -22,6 +22,8 @@ from django.shortcuts import render
 
 import requests
 
+from services.json_backends import format_datetime, format_date, format_time
+
 GOOGLE_GEOCODING_URL = "http://maps.googleapis.com/maps/api/geocode/json?sensor=false"
 GEOIP_URL = "http://api.hostip.info/get_json.php?ip=%s&position=true"
 
@@ -279,14 +281,13 @@ class DateTimeAwareJSONEncoder(DefaultJSONEncoder):
     TIME_FORMAT = "%H:%M:%S.%f"
 
     def default(self, o):
+        # same output as strftime with DATE_FORMAT/TIME_FORMAT (milliseconds for datetimes), without the strftime
         if isinstance(o, datetime.datetime):
-            o = datetime.datetime(o.year, o.month, o.day, o.hour, o.minute, o.second, o.microsecond)
-            r = o.strftime(self.DATE_FORMAT + 'T' + self.TIME_FORMAT)
-            return r[:-3]
+            return format_datetime(o)
         elif isinstance(o, datetime.date):
-            return o.strftime(self.DATE_FORMAT)
+            return format_date(o)
         elif isinstance(o, datetime.time):
-            return o.strftime(self.TIME_FORMAT)
+            return format_time(o)
         else:
             return super(DateTimeAwareJSONEncoder, self).default(o)
 
@@ -308,16 +309,102 @@ first_cap_re = re.compile('(.)([A-Z][a-z]+)')
 all_cap_re = re.compile('([a-z0-9])([A-Z])')
 
 
-def camel(value):
+def parse_accept_header(value):
+    """
+    [(token, q)] for the entries of an Accept style header (Accept, Accept-Encoding) in the order they were
+    sent, tokens lowercased, a q that isn't a number counting as 0
+    """
+    ret = []
+    for entry in value.split(','):
+        parts = entry.split(';')
+        token = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, param_value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    quality = 0.0
+        if token:
+            ret.append((token, quality))
+    return ret
+
+
+class KeyCache(object):
+
+    """
+    Memoizes a key conversion like camel/un_camel. Keeps the most recently used keys in two generations of
+    up to `maxsize` each, keys that go unused for a whole generation are dropped.
+    """
+
+    def __init__(self, func, maxsize=10000):
+        self.func = func
+        self.maxsize = maxsize
+        self.recent = {}
+        self.older = {}
+
+    def __call__(self, key):
+        try:
+            return self.recent[key]
+        except KeyError:
+            pass
+
+        try:
+            value = self.older[key]
+        except KeyError:
+            value = self.func(key)
+
+        recent = self.recent
+        recent[key] = value
+        if len(recent) > self.maxsize:
+            self.older = recent
+            self.recent = {}
+        return value
+
+    def clear(self):
+        self.recent = {}
+        self.older = {}
+
+
+def _camel(value):
     def camelcase():
-        yield str.lower
+        yield lambda x: x.lower()
         while True:
-            yield str.capitalize
+            yield lambda x: x.capitalize()
 
     c = camelcase()
     return "".join(c.next()(x) if x else '_' for x in value.split("_"))
 
 
+def _un_camel(string):
+    s1 = first_cap_re.sub(r'\1_\2', string)
+    return all_cap_re.sub(r'\1_\2', s1).lower()
+
+camel = KeyCache(_camel)
+un_camel = KeyCache(_un_camel)
+
+
+def transform_keys(obj, convert):
+    """
+    Copies dicts (and the lists holding them) all the way down, renaming string keys with `convert`
+    """
+    if isinstance(obj, dict):
+        return {(convert(k) if isinstance(k, basestring) else k): transform_keys(v, convert)
+                for k, v in obj.iteritems()}
+    if isinstance(obj, (list, tuple)):
+        return [transform_keys(v, convert) for v in obj]
+    return obj
+
+
+def camel_keys(obj):
+    return transform_keys(obj, camel)
+
+
+def un_camel_keys(obj):
+    return transform_keys(obj, un_camel)
+
+
 def camel_dict(dictionary):
     ret = {}
     for k, v in dictionary.items():
@@ -326,11 +413,6 @@ def camel_dict(dictionary):
     return ret
 
 
-def un_camel(string):
-    s1 = first_cap_re.sub(r'\1_\2', string)
-    return all_cap_re.sub(r'\1_\2', s1).lower()
-
-
 def un_camel_dict(dictionary):
     ret = {}
     for key, value in dictionary.items():
@@ -1,12 +1,35 @@
 from django.core import serializers
+import base64
+import calendar
+import hashlib
+import inspect
+import operator
+import time
 import simplejson
 import logging
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.db import models
+from django.db.models import Count, Max, Q
+from django.db.models.query import QuerySet
+from django.db.models.signals import post_init
+try:
+    from django.db.models.query import ModelIterable
+except ImportError:
+    # django < 1.9, instances only
+    ModelIterable = None
+from django.utils.http import http_date, parse_http_date_safe
 
 from django.conf import settings
 from django.core.paginator import EmptyPage, Paginator
-from services.utils import camel_dict
+from services.utils import camel_keys, un_camel, camel
 from services.payload import Payload
+from services.counts import ExactCount
+from services.compression import compress_response
+from services.formats import get_formats, get_response_format, JSON
+from services.json_backends import get_json_backend
+from services.timing import get_timer
+from services.loaders import get_loader, infer_related, queries_saved
+from services.models import BaseModel, BaseModelMixin
 
 JSON_INDENT = 4
 
@@ -22,6 +45,9 @@ class BaseView(object):
     A generic response object for generating and returning api responses
     """
 
+    # gzip/brotli the body for clients that ask, see services.compression
+    compress = True
+
     def __init__(self, request=None):
         self.reset(request)
 
@@ -116,6 +142,66 @@ class BaseView(object):
     def should_render(self, request):
         return True
 
+    def should_stream(self, request):
+        return False
+
+    def render_stream(self, request):
+        """
+        Yields the response body in pieces, for views that should_stream. Here it's the whole body in one,
+        views with a lot to send render it a piece at a time
+        """
+        yield self.dumps(get_response_format(request), self.get_response_dict())
+
+    def prepare(self, request):
+        """
+        Called before anything is rendered, views can validate the request and adjust their data here
+        """
+        pass
+
+    def get_validators(self, request):
+        """
+        Returns (etag, last_modified) used to answer conditional GETs before anything is rendered,
+        (None, None) when the response can't be validated cheaply
+        """
+        return None, None
+
+    def build_etag(self, request, *parts):
+        """
+        Builds a weak etag from `parts`, varied on the things besides the data that change our output
+        """
+        parts = (self.__class__.__name__, self.camel_case, get_response_format(request).name,
+                 request.META.get('QUERY_STRING', '')) + parts
+        return 'W/"%s"' % hashlib.md5(':'.join(str(part) for part in parts)).hexdigest()
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and etag:
+            # weak comparison, which is what GET calls for
+            etags = [e.strip() for e in if_none_match.split(',')]
+            return '*' in etags or self._strip_weak(etag) in [self._strip_weak(e) for e in etags]
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since is not None and last_modified is not None:
+            return self._timestamp(last_modified) <= if_modified_since
+
+        return False
+
+    def _strip_weak(self, etag):
+        if etag.startswith('W/'):
+            etag = etag[2:]
+        return etag.strip('"')
+
+    def _timestamp(self, value):
+        # our datetimes are utc, aware or not
+        return calendar.timegm(value.utctimetuple())
+
+    def set_validator_headers(self, http_response, etag, last_modified):
+        if etag:
+            http_response['ETag'] = etag
+        if last_modified is not None:
+            http_response['Last-Modified'] = http_date(self._timestamp(last_modified))
+        return http_response
+
     def _render(self, request):
         if(self.should_render(request)):
             return self.render(request)
@@ -137,8 +223,6 @@ class BaseView(object):
         return False
 
     def serialize(self, messages=None, errors=None, status=None):
-        from services.utils import DateTimeAwareJSONEncoder
-
         if errors:
             self.add_errors(errors)
 
@@ -148,6 +232,45 @@ class BaseView(object):
         if messages:
             self.add_messages(messages)
 
+        request = self._request
+        timer = get_timer(request)
+        start = time.time()
+        if request is not None and self.success:
+            self.prepare(request)
+
+        etag, last_modified = None, None
+        if (request is not None and request.method in ('GET', 'HEAD') and self.success and
+                self._status == 200 and self.should_render(request)):
+            etag, last_modified = self.get_validators(request)
+            if self.is_not_modified(request, etag, last_modified):
+                timer.lap('render', start)
+                return self.set_validator_headers(HttpResponseNotModified(), etag, last_modified)
+
+        response_format = get_response_format(request)
+        if self.success and request is not None and response_format.streamable and self.should_stream(request):
+            http_response = StreamingHttpResponse(self.render_stream(request), status=self._status)
+            http_response['Content-Type'] = response_format.content_type
+            for header, value in self.headers.items():
+                http_response[header] = value
+            # the body is rendered and encoded as it's written out, after we're timed
+            timer.lap('render', start)
+            return self.finish_http_response(request, http_response, etag, last_modified)
+
+        response_dict = self.get_response_dict()
+        start = timer.lap('render', start)
+        response_body = self.dumps(response_format, response_dict)
+
+        http_response = HttpResponse(response_body, status=self._status)
+        http_response['Content-Type'] = response_format.content_type
+        if len(get_formats()) > 1:
+            http_response['Vary'] = 'Accept'
+        for header, value in self.headers.items():
+            http_response[header] = value
+        http_response = self.finish_http_response(request, http_response, etag, last_modified)
+        timer.lap('encode', start)
+        return http_response
+
+    def get_response_dict(self):
         if legacy_format:
             response_dict = {}
             response_dict['data'] = self._render(self._request)
@@ -161,18 +284,26 @@ class BaseView(object):
                 response_dict = self._render(self._request)
 
         if self.camel_case:
-            response_dict = camel_dict(response_dict)
+            response_dict = camel_keys(response_dict)
+        return response_dict
 
+    def dumps(self, response_format, response_dict):
         if self.pretty_print:
-            response_body = simplejson.dumps(response_dict, cls=DateTimeAwareJSONEncoder, indent=JSON_INDENT)
+            response_body = response_format.dumps(response_dict, indent=JSON_INDENT)
         else:
-            response_body = simplejson.dumps(response_dict, cls=DateTimeAwareJSONEncoder)
+            response_body = response_format.dumps(response_dict)
 
-        if response_body == '{}':
+        if response_format is JSON and response_body == '{}':
             response_body = ''
-
-        http_response = HttpResponse(response_body, status=self._status)
-        http_response['Content-Type'] = 'application/json'
+        return response_body
+
+    def finish_http_response(self, request, http_response, etag, last_modified):
+        self.set_validator_headers(http_response, etag, last_modified)
+        if self.compress and request is not None:
+            if not http_response.streaming:
+                # kept for the event log, which has no use for the compressed body
+                http_response.uncompressed_content = http_response.content
+            compress_response(request, http_response)
         return http_response
 
 
@@ -195,16 +326,81 @@ class ModelView(BaseView):
     _fields = ()
     # blacklist fields to render
     _hides = ()
+    # relations a custom render walks besides those in _fields, loaded in batches along with them
+    _related = ()
+
+    def reset(self, request):
+        super(ModelView, self).reset(request)
+        # the subset of fields asked for with ?fields=
+        self._requested_fields = None
 
     def should_render(self, request):
         return self.instance
 
+    def prepare(self, request):
+        if not self.should_render(request):
+            return
+        try:
+            self._requested_fields = self.get_requested_fields(request, self.instance.__class__)
+        except InvalidFieldsException as e:
+            self._data = {}
+            self.bad_request(str(e))
+
+    @classmethod
+    def get_renderable_fields(cls, model):
+        """
+        The names ?fields= may pick from, None if we can't tell for this model
+        """
+        if cls._fields:
+            names = list(cls._fields)
+        elif hasattr(model, '_meta'):
+            names = [f.attname for f in model._meta.fields]
+        else:
+            return None
+        return [name for name in names if name not in cls._hides]
+
+    @classmethod
+    def get_requested_fields(cls, request, model):
+        """
+        The fields the client asked for with ?fields=a,b,c validated against the model, or None for all of them
+        """
+        fields = request.GET.get('fields')
+        if not fields:
+            return None
+
+        requested = [f.strip() for f in fields.split(',') if f.strip()]
+        if getattr(request, 'camel_case', False):
+            requested = [un_camel(f) for f in requested]
+
+        renderable = cls.get_renderable_fields(model)
+        if renderable is not None:
+            unknown = [f for f in requested if f not in renderable]
+            if unknown:
+                raise InvalidFieldsException("Unknown field(s): %s" % ', '.join(unknown))
+        return requested
+
+    @classmethod
+    def get_related_names(cls, fields=None):
+        """
+        The names whose relations are loaded along with the rows, see services.loaders
+        """
+        names = fields if fields is not None else cls._fields
+        return tuple(names) + tuple(cls._related)
+
     def render(self, request):
 
         ret = {}
+        if hasattr(self.instance, '_meta'):
+            get_loader(request).prime([self.instance], self.get_related_names(self._requested_fields))
+
+        if self._requested_fields is not None:
+            for field in self._requested_fields:
+                set_field_value(ret, field, get_field_value(self.instance, field))
+            return ret
+
         if self._fields:
             for field in self._fields:
-                ret[field] = getattr(self.instance, field)
+                set_field_value(ret, field, get_field_value(self.instance, field))
 
         elif hasattr(self.instance, 'dict'):
             ret = self.instance.dict
@@ -223,51 +419,534 @@ class ModelView(BaseView):
     def instance(self):
         return self._data.get('instance', None)
 
+    def get_validators(self, request):
+        last_modified = getattr(self.instance, 'last_modified', None)
+        if last_modified is None:
+            return None, None
+
+        instance = self.instance
+        etag = self.build_etag(request, instance.__class__.__name__, getattr(instance, 'pk', None),
+                               last_modified.isoformat())
+        return etag, last_modified
+
     @classmethod
-    def render_instance(cls, instance, request):
+    def render_instance(cls, instance, request, fields=None):
         """A Helper method so QuerySet Views can make use of the instance's ModelView"""
         view = cls(request=request)
         view.set(instance=instance)
+        view._requested_fields = fields
         return view.render(request)
 
 
+class CompiledRenderer(object):
+
+    """
+    How a ModelView subclass renders one model class, worked out once so a whole queryset
+    can be rendered in one loop, without a view per row and, when the rows can be rendered
+    straight from their columns, without building model instances at all (values_list).
+
+    Views that override render or render_instance are rendered row by row as before.
+    """
+
+    def __init__(self, view_class, model):
+        self.view_class = view_class
+        self.model = model
+        self.hides = frozenset(view_class._hides)
+        self.related_names = view_class.get_related_names()
+        self.compiled = (_func(view_class.render) is _func(ModelView.render) and
+                         _func(view_class.render_instance) is _func(ModelView.render_instance))
+
+        dict_property = None
+        for klass in inspect.getmro(model):
+            if 'dict' in klass.__dict__:
+                dict_property = klass.__dict__['dict']
+                break
+        # BaseModel's dict is __dict__ without the _private bits, which we can do inline
+        self.custom_dict = dict_property is not None and dict_property not in _standard_dict_properties
+
+        self.columns = ()
+        self.values_safe = False
+        if hasattr(model, '_meta') and ModelIterable is not None:
+            self.columns = tuple(f.attname for f in model._meta.concrete_fields)
+            # values_list only matches the instances when nothing runs as they're built
+            self.values_safe = (self.compiled and not self.custom_dict and
+                                _func(model.__init__) is _func(models.Model.__init__) and
+                                not post_init.has_listeners(model))
+
+    def get_names(self, fields=None):
+        if fields is not None:
+            return list(fields)
+        if self.view_class._fields:
+            return [f for f in self.view_class._fields if f not in self.hides]
+        return None
+
+    def get_values_names(self, queryset, fields=None):
+        """
+        The values_list() columns that render `queryset` exactly, None when instances are needed
+        """
+        if not self.values_safe or not isinstance(queryset, QuerySet) or queryset._result_cache is not None:
+            return None
+
+        query = queryset.query
+        if (queryset._iterable_class is not ModelIterable or queryset._prefetch_related_lookups or
+                query.extra_select):
+            return None
+
+        annotations = list(query.annotation_select)
+        names = self.get_names(fields)
+        if names is None:
+            # everything in __dict__, all columns have to be loaded for that
+            if query.deferred_loading[0] or not query.deferred_loading[1]:
+                return None
+            names = [n for n in list(self.columns) + annotations if n not in self.hides]
+
+        if not all(n in self.columns or n in annotations for n in names):
+            return None
+        return names
+
+    def row_renderer(self, request, fields=None):
+        """
+        A function rendering one instance the way view_class.render_instance would
+        """
+        if not self.compiled:
+            view_class = self.view_class
+            if fields is None:
+                return lambda obj: view_class.render_instance(obj, request)
+            return lambda obj: view_class.render_instance(obj, request, fields=fields)
+
+        names = self.get_names(fields)
+        if names is not None:
+            if not names:
+                return lambda obj: {}
+            if any('.' in name for name in names):
+                def render_paths(obj):
+                    ret = {}
+                    for name in names:
+                        set_field_value(ret, name, get_field_value(obj, name))
+                    return ret
+                return render_paths
+            getter = operator.attrgetter(*names)
+            if len(names) == 1:
+                name = names[0]
+                return lambda obj: {name: getter(obj)}
+            return lambda obj: dict(zip(names, getter(obj)))
+
+        hides = self.hides
+        if self.custom_dict:
+            def render_dict(obj):
+                ret = dict(obj.dict)
+                for field in hides:
+                    ret.pop(field, None)
+                return ret
+            return render_dict
+
+        return lambda obj: {k: v for k, v in obj.__dict__.iteritems() if k[:1] != '_' and k not in hides}
+
+    def render(self, rows, request, fields=None):
+        names = self.get_values_names(rows, fields)
+        if names is not None:
+            return [dict(zip(names, row)) for row in rows.values_list(*names)]
+        rows = list(rows)
+        self.load_related(rows, request, fields)
+        return map(self.row_renderer(request, fields), rows)
+
+    def render_iter(self, queryset, request, fields=None, chunk_size=500):
+        names = self.get_values_names(queryset, fields)
+        if names is not None:
+            for row in iterate_queryset(queryset.values_list(*names), chunk_size):
+                yield dict(zip(names, row))
+            return
+
+        render_row = self.row_renderer(request, fields)
+        chunk = []
+        for obj in iterate_queryset(queryset, chunk_size):
+            chunk.append(obj)
+            if len(chunk) == chunk_size:
+                self.load_related(chunk, request, fields)
+                for obj in chunk:
+                    yield render_row(obj)
+                chunk = []
+        self.load_related(chunk, request, fields)
+        for obj in chunk:
+            yield render_row(obj)
+
+    def load_related(self, rows, request, fields=None):
+        """
+        Loads the relations the view renders for all of `rows` at once, an IN query per related model
+        """
+        names = self.related_names if fields is None else self.view_class.get_related_names(fields)
+        if names:
+            get_loader(request).prime(rows, names)
+
+
+# (ModelView subclass, model class) -> CompiledRenderer
+_renderers = {}
+
+
+def get_renderer(view_class, model):
+    key = (view_class, model)
+    try:
+        return _renderers[key]
+    except KeyError:
+        renderer = _renderers[key] = CompiledRenderer(view_class, model)
+        return renderer
+
+
+def get_field_value(obj, name):
+    """
+    getattr, following dotted names through relations, None past a relation that is None
+    """
+    if '.' not in name:
+        return getattr(obj, name)
+    for part in name.split('.'):
+        if obj is None:
+            return None
+        obj = getattr(obj, part)
+    return obj
+
+
+def set_field_value(ret, name, value):
+    """
+    ret[name] = value, dotted names nest: author.name is ret['author']['name']
+    """
+    if '.' not in name:
+        ret[name] = value
+        return
+    parts = name.split('.')
+    for part in parts[:-1]:
+        nested = ret.get(part)
+        if not isinstance(nested, dict):
+            nested = ret[part] = {}
+        ret = nested
+    ret[parts[-1]] = value
+
+
+def _func(method):
+    return getattr(method, '__func__', method)
+
+_standard_dict_properties = (BaseModel.__dict__['dict'], BaseModelMixin.__dict__['dict'])
+
+
 class QuerySetView(BaseView):
     model_view = ModelView
     paging = False
     queryset_label = 'results'
+    # 'offset' pages with page_number and a total count, 'cursor' pages by keyset on cursor_ordering
+    paging_mode = 'offset'
+    # indexed, non null columns, unique together, the model's rows are paged in this order
+    cursor_ordering = ('created_date', 'id')
+    # write the results out as they are read instead of building the whole response in memory
+    stream = False
+    stream_chunk_size = 500
+    # how auto_page finds the total_count, see services.counts
+    count_strategy = ExactCount()
 
     def should_render(self, request):
         return self.queryset is not None
 
-    def __init__(self, request=None, model_view=None, paging=False):
+    def __init__(self, request=None, model_view=None, paging=False, stream=False, count_strategy=None):
         self.model_view = model_view or self.model_view
         self.paging = paging or self.paging
+        self.stream = stream or self.stream
+        self.count_strategy = count_strategy or self.count_strategy
         super(QuerySetView, self).__init__(request=request)
 
+    def reset(self, request):
+        super(QuerySetView, self).reset(request)
+        # count learned while building validators, saves auto_page a COUNT(*)
+        self._known_count = None
+        self._requested_fields = None
+        # decoded ?cursor=, (direction, values)
+        self._cursor = None
+        # (select_related, prefetch_related) lookups prepare_related added
+        self._related_lookups = None
+
     @property
     def queryset(self):
         return self._data.get('queryset', None)
 
+    def prepare(self, request):
+        queryset = self.queryset
+        if not hasattr(queryset, 'model'):
+            return
+
+        try:
+            if self.paging and self.paging_mode == 'cursor':
+                self._cursor = self.decode_cursor(queryset.model, request.GET.get('cursor'))
+            self.prepare_fields(request, queryset)
+        except (InvalidFieldsException, InvalidCursorException) as e:
+            self._data = {}
+            self.bad_request(str(e))
+            return
+        self.prepare_related(request)
+
+    def prepare_fields(self, request, queryset):
+        if not hasattr(self.model_view, 'get_requested_fields'):
+            return
+
+        fields = self.model_view.get_requested_fields(request, queryset.model)
+        if fields is None:
+            return
+
+        self._requested_fields = fields
+        # push the subset down to the query when every field is a column
+        names = dict((f.attname, f.name) for f in queryset.model._meta.fields)
+        if all(field in names for field in fields):
+            only = [names[field] for field in fields]
+            if self.paging and self.paging_mode == 'cursor':
+                # the cursor is built from these, don't defer them
+                only.extend(field.name for field, _ in self.get_cursor_fields(queryset.model))
+            if queryset.query.select_related:
+                # none of these are relations, and a deferred relation can't be selected
+                queryset = queryset.select_related(None)
+            self._data['queryset'] = queryset.only(*only)
+
+    def prepare_related(self, request):
+        """
+        Adds select_related / prefetch_related for the relations model_view renders
+        """
+        if not hasattr(self.model_view, 'get_related_names'):
+            return
+
+        names = self.model_view.get_related_names(self._requested_fields)
+        # prefetch_related is skipped by iterator(), streamed rows get theirs from the RelatedLoader
+        queryset, select, prefetch = infer_related(self.queryset, names, prefetch=not self.should_stream(request))
+        if select or prefetch:
+            self._data['queryset'] = queryset
+            self._related_lookups = (select, prefetch)
+
+    def report_related(self, rows):
+        """
+        In DEBUG, what prepare_related added and about how many queries it saved, as an X-Related header
+        """
+        select, prefetch = self._related_lookups
+        report = 'select_related=%s; prefetch_related=%s; queries_saved=%d' % (
+            ','.join(select), ','.join(prefetch), queries_saved(rows, select, prefetch))
+        self.headers['X-Related'] = report
+        logger.debug("%s: %s" % (self.__class__.__name__, report))
+
+    def render_instance(self, obj, request):
+        if self._requested_fields is not None:
+            return self.model_view.render_instance(obj, request, fields=self._requested_fields)
+        return self.model_view.render_instance(obj, request)
+
+    def get_renderer(self, rows):
+        """
+        The CompiledRenderer for rows (a queryset or list of one model), None if model_view isn't a ModelView
+        """
+        model_view = self.model_view
+        if not isinstance(model_view, type):
+            model_view = model_view.__class__
+        if not issubclass(model_view, ModelView):
+            return None
+
+        model = getattr(rows, 'model', None)
+        if model is None:
+            if not rows:
+                return None
+            model = type(rows[0])
+            if not all(type(obj) is model for obj in rows):
+                return None
+        return get_renderer(model_view, model)
+
+    def render_rows(self, rows, request):
+        renderer = self.get_renderer(rows)
+        if renderer is None:
+            ret = [self.render_instance(obj, request) for obj in rows]
+        else:
+            ret = renderer.render(rows, request, fields=self._requested_fields)
+        if self._related_lookups and settings.DEBUG:
+            self.report_related(len(ret))
+        return ret
+
+    def get_validators(self, request):
+        """
+        One aggregate query for max(last_modified) and count, new, changed and deleted rows all change the etag.
+        Views counting with a cached or estimated count get no validators, only an exact count sees every delete.
+        There's no Last-Modified, max(last_modified) alone doesn't move when a row is deleted
+        """
+        queryset = self.queryset
+        if self.paging and self.paging_mode == 'cursor':
+            # the aggregate is a scan of everything, which is what cursor paging is avoiding
+            return None, None
+
+        if not hasattr(queryset, 'aggregate') or queryset.query.low_mark or queryset.query.high_mark is not None:
+            return None, None
+
+        model = queryset.model
+        if 'last_modified' not in [f.name for f in model._meta.fields]:
+            return None, None
+
+        if not self.count_strategy.exact:
+            # a cached or estimated count doesn't move when a row that isn't the newest is deleted
+            return None, None
+
+        stats = queryset.aggregate(latest=Max('last_modified'), count=Count('pk'))
+        self._known_count = stats['count']
+        latest = stats['latest']
+        etag = self.build_etag(request, model._meta.db_table, stats['count'], latest.isoformat() if latest else '')
+        return etag, None
+
     def render(self, request):
         queryset = self.queryset
 
         if self.paging:
             return self.render_paged(request, queryset)
 
-        ret = [self.model_view.render_instance(obj, request) for obj in queryset]
+        ret = self.render_rows(queryset, request)
         ret = self.sort(ret, request)
 
         return {self.queryset_label: ret}
 
+    def should_stream(self, request):
+        # paged results are small already, and sort() needs the whole list
+        return self.stream and not self.paging and self.should_render(request)
+
+    def render_stream(self, request):
+        """
+        Renders the queryset one row at a time, keeping the same envelope serialize would produce
+        """
+        backend = get_json_backend()
+
+        label = self.queryset_label
+        if self.camel_case:
+            label = camel(label)
+
+        if legacy_format:
+            yield '{"data": {%s: [' % backend.dumps(label)
+        else:
+            yield '{%s: [' % backend.dumps(label)
+
+        rows = []
+        separator = ''
+        queryset = self.queryset
+        renderer = self.get_renderer(queryset) if hasattr(queryset, 'model') else None
+        if renderer is not None:
+            rendered = renderer.render_iter(queryset, request, self._requested_fields, self.stream_chunk_size)
+        else:
+            rendered = (self.render_instance(obj, request) for obj in iterate_queryset(queryset, self.stream_chunk_size))
+
+        if self.camel_case:
+            rendered = (camel_keys(row) for row in rendered)
+
+        for row in rendered:
+            rows.append(backend.dumps(row))
+            if len(rows) == self.stream_chunk_size:
+                yield separator + ', '.join(rows)
+                separator = ', '
+                rows = []
+        if rows:
+            yield separator + ', '.join(rows)
+
+        if legacy_format:
+            yield ']}, "errors": [], "success": true}'
+        else:
+            yield ']}'
+
     def render_paged(self, request, queryset):
+        if self.paging_mode == 'cursor':
+            return self.render_cursor_paged(request, queryset)
+
         results, paging_dict = self.auto_page(
             queryset, page_number=request.GET.get('page_number', 1), limit=request.GET.get('limit', 20))
 
-        ret = [self.model_view.render_instance(obj, request) for obj in results]
+        ret = self.render_rows(results, request)
         ret = self.sort(ret, request)
 
         return {self.queryset_label: ret, 'paging': paging_dict}
 
+    def render_cursor_paged(self, request, queryset):
+        results, paging_dict = self.cursor_page(queryset, cursor=self._cursor, limit=request.GET.get('limit', 20))
+
+        ret = self.render_rows(results, request)
+        ret = self.sort(ret, request)
+
+        return {self.queryset_label: ret, 'paging': paging_dict}
+
+    def get_cursor_fields(self, model):
+        """
+        [(field, descending)] for our cursor_ordering
+        """
+        ret = []
+        for name in self.cursor_ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            ret.append((field, descending))
+        return ret
+
+    def encode_cursor(self, obj, direction):
+        values = [field.value_to_string(obj) for field, _ in self.get_cursor_fields(obj.__class__)]
+        return base64.urlsafe_b64encode(simplejson.dumps([direction, values])).rstrip('=')
+
+    def decode_cursor(self, model, cursor):
+        if not cursor:
+            return None
+        try:
+            cursor = str(cursor)
+            direction, values = simplejson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            fields = self.get_cursor_fields(model)
+            if direction not in ('next', 'prev') or len(values) != len(fields):
+                raise ValueError
+            return direction, [field.to_python(value) for (field, _), value in zip(fields, values)]
+        except Exception:
+            raise InvalidCursorException("Invalid cursor")
+
+    def cursor_page(self, results, cursor=None, limit=20):
+        """
+        Keyset paging: one LIMIT limit + 1 query past the cursor's row, no COUNT and no OFFSET
+        """
+        try:
+            limit = max(int(limit), 1)
+        except ValueError:
+            limit = 20
+
+        fields = self.get_cursor_fields(results.model)
+        direction, values = cursor or ('next', None)
+        backwards = direction == 'prev'
+
+        # walking backwards is walking forwards in the reverse order
+        ordering = []
+        for field, descending in fields:
+            ordering.append(('-' if descending != backwards else '') + field.attname)
+
+        if values is not None:
+            results = results.filter(self.keyset_filter(fields, values, backwards))
+
+        rows = list(results.order_by(*ordering)[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = prev_cursor = None
+        if rows:
+            # there's always something behind us when we came from a cursor, ahead of us when walking back
+            if backwards or has_more:
+                next_cursor = self.encode_cursor(rows[-1], 'next')
+            if (backwards and has_more) or (not backwards and values is not None):
+                prev_cursor = self.encode_cursor(rows[0], 'prev')
+
+        page_dict = {'next_cursor': next_cursor,
+                     'prev_cursor': prev_cursor,
+                     'limit': limit}
+
+        return rows, page_dict
+
+    def keyset_filter(self, fields, values, backwards):
+        """
+        Rows strictly after `values` in our ordering (before, when walking backwards):
+        (a > x) or (a = x and b > y) or ...
+        """
+        keyset = Q()
+        for i, (field, descending) in enumerate(fields):
+            lookup = 'lt' if descending != backwards else 'gt'
+            clause = Q(**{'%s__%s' % (field.attname, lookup): values[i]})
+            for j in range(i):
+                clause &= Q(**{fields[j][0].attname: values[j]})
+            keyset |= clause
+        return keyset
+
     @classmethod
     def inline_render(cls, queryset, request, model_view=None):
         """
@@ -282,7 +961,10 @@ class QuerySetView(BaseView):
 
     def auto_page(self, results, page_number=1, limit=10):
 
-        total_count = results.count()
+        if self._known_count is not None and results is self.queryset:
+            total_count = self._known_count
+        else:
+            total_count = self.count_strategy.count(results)
         try:
             page_number = int(page_number)
             limit = int(limit)
@@ -290,7 +972,8 @@ class QuerySetView(BaseView):
             page_number = 1
             limit = 10
 
-        pages = Paginator(results, limit)
+        # we've counted already, don't let the paginator count again
+        pages = CountedPaginator(results, limit, total_count)
         try:
             page = pages.page(page_number)
         except EmptyPage:
@@ -321,3 +1004,47 @@ class QuerySetView(BaseView):
 
 class PagingQuerySetView(QuerySetView):
     paging = True
+
+
+class CountedPaginator(Paginator):
+
+    """
+    A Paginator that is told its count instead of running one
+    """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super(CountedPaginator, self).__init__(object_list, per_page, **kwargs)
+        self._total_count = count
+
+    @property
+    def count(self):
+        return self._total_count
+
+
+class CursorPagingQuerySetView(PagingQuerySetView):
+    paging_mode = 'cursor'
+
+
+class StreamingQuerySetView(QuerySetView):
+    stream = True
+
+
+def iterate_queryset(queryset, chunk_size):
+    """
+    Iterate a queryset without filling its result cache, fetching chunk_size rows at a time where Django lets us
+    """
+    if not hasattr(queryset, 'iterator'):
+        return iter(queryset)
+    try:
+        return queryset.iterator(chunk_size=chunk_size)
+    except TypeError:
+        # django < 2.0, no chunk_size
+        return queryset.iterator()
+
+
+class InvalidFieldsException(ValueError):
+    pass
+
+
+class InvalidCursorException(ValueError):
+    pass